@@ -4,6 +4,23 @@ import pandas as pd
 import pickle
 import os
 import math
+import time
+import functools
+import hmac
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import drift
+import metrics
+from audit import AUDIT_DB, AuditLog
+from flat_ensemble import FlatEnsemble
+from bundle import BUNDLE_FILE, REPLICAS_FILE, load_bundle
+from risk_table import RiskTable, TABLE_FILE, META_FILE
+from similarity import SymptomIndex, symptom_mask
+from explorer_stats import compute_explorer_stats, file_digest
+from survey import FEATURE_NAMES, RAW_CSV, clean_columns, read_survey
+from score_batch import BatchJob, PRED_COL, PROBA_COL, UPLOAD_EXTS, read_upload
+from model_store import ModelStore
+from treeshap import TreeShap
 
 # ── Path resolution: works locally AND on Streamlit Cloud ──
 # On Streamlit Cloud, __file__ may point inside a venv; we check
@@ -20,25 +37,136 @@ def p(filename):
     # fallback — return relative path and let the error surface clearly
     return filename
 
-st.set_page_config(page_title="🫁 Lung Cancer Risk Predictor", page_icon="🫁", layout="wide")
-
-@st.cache_resource
-def load_all():
-    with open(p("lung_xgb_model.pkl"),"rb") as f: model = pickle.load(f)
-    with open(p("lung_le_gender.pkl"),"rb") as f: le_g = pickle.load(f)
-    with open(p("lung_le_target.pkl"),"rb") as f: le_t = pickle.load(f)
-    with open(p("lung_artifacts.pkl"),"rb") as f: arts = pickle.load(f)
-    return model, le_g, le_t, arts
+def out_path(filename):
+    # files the app writes (metrics textfile, audit log): next to app.py unless absolute
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
 
-model, le_g, le_t, arts = load_all()
+st.set_page_config(page_title="🫁 Lung Cancer Risk Predictor", page_icon="🫁", layout="wide")
 
-@st.cache_data
-def load_data():
-    df = pd.read_csv(p("survey lung cancer.csv"))
-    df.columns = df.columns.str.strip()
-    return df
+# Hot-path timings (metrics.py): one histogram, labelled by stage; see the admin panel at the bottom
+STAGE = "lung_app_stage_seconds"
+_run_t0 = time.perf_counter()
+
+def export_metrics():
+    try:
+        metrics.REGISTRY.write(out_path(metrics.METRICS_FILE))     # Prometheus textfile, at most every 10 s
+    except OSError:
+        pass                                             # read-only deploy: panel still works
+
+def exported(fn):
+    # fragment reruns (every Predict click) never reach the end of the script, so
+    # each fragment renderer offers the throttled export itself when it finishes
+    @functools.wraps(fn)
+    def inner(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            export_metrics()
+    return inner
+
+def load_models():
+    # everything derived from the model files, built together so one swap replaces all of it
+    metrics.inc("lung_app_cache_miss_total", resource="load_all")
+    if os.path.exists(p(BUNDLE_FILE)):
+        # single memory-mapped bundle — no sklearn import needed
+        engine, header = load_bundle(p(BUNDLE_FILE))
+        arts = header["artifacts"]
+    else:
+        # legacy layout: separate pickles written by older train_model.py runs
+        with open(p("lung_xgb_model.pkl"),"rb") as f: model = pickle.load(f)
+        with open(p("lung_artifacts.pkl"),"rb") as f: arts = pickle.load(f)
+        engine = FlatEnsemble.from_model(model)
+    return {
+        "engine": engine, "arts": arts, "fingerprint": engine.fingerprint(),
+        # precomputed risk table (build with `python risk_table.py`); None if absent or stale
+        "risk_table": RiskTable.load(p(TABLE_FILE), p(META_FILE), engine.fingerprint()),
+        # bagged replicas for an uncertainty interval (train_model.py --replicas K); None if not trained
+        "replicas": load_bundle(p(REPLICAS_FILE))[0] if os.path.exists(p(REPLICAS_FILE)) else None,
+        # per-patient TreeSHAP contributions; None for bundles saved without node cover
+        "explainer": TreeShap(engine) if engine.cover is not None else None,
+    }
 
-df_raw = load_data()
+def validate_models(m):
+    # reject a new version before it can serve: schema, and sane probabilities on a canary row
+    engine = m["engine"]
+    if engine.feature_names is not None and list(engine.feature_names) != FEATURE_NAMES:
+        raise ValueError(f"feature names {list(engine.feature_names)} != {FEATURE_NAMES}")
+    proba = engine.predict(np.array([[1, 65] + [1] * 13], dtype=np.float32))[1]
+    if not (np.isfinite(proba).all() and ((proba >= 0) & (proba <= 1)).all()):
+        raise ValueError(f"canary prediction out of range: {proba}")
+    for key in ("accuracy", "auc", "fi_sorted"):
+        if key not in m["arts"]:
+            raise ValueError(f"artifacts missing {key!r}")
+
+# Model files are watched by a background thread (model_store.py): a retrained
+# bundle is loaded, validated and swapped in without a restart. Each run takes
+# one snapshot, so a run that started on the old version finishes on it.
+@st.cache_resource(on_release=lambda store: store.close())
+def model_store():
+    return ModelStore(load_models, [p(BUNDLE_FILE), p(REPLICAS_FILE), p(TABLE_FILE), p(META_FILE),
+                                    p("lung_xgb_model.pkl"), p("lung_artifacts.pkl")], validate_models)
+
+def current_models():
+    # → (snapshot, engine, arts, risk_table, replicas, explainer) of the version serving now.
+    # Fragments call this themselves: a fragment-only rerun reuses the globals of the
+    # last full run, so module-level names would keep serving a swapped-out model.
+    snap = model_store().current
+    drift.set_reference(snap.value["arts"].get("drift_reference"))   # for the lung_drift_* export; None in older artifacts
+    return (snap,) + tuple(snap.value[k] for k in ("engine", "arts", "risk_table", "replicas", "explainer"))
+
+with metrics.timer(STAGE, stage="load_all"):
+    store = model_store()
+snapshot, engine, arts, risk_table, replicas, explainer = current_models()
+
+# Every Predict-tab prediction goes to an append-only audit log (audit.py): the
+# click only enqueues a row; a background thread commits batches to SQLite/WAL.
+@st.cache_resource(on_release=lambda log: log.close())
+def audit_log():
+    return AuditLog(out_path(AUDIT_DB))
+
+def predict_batch(X, engine, risk_table):
+    # P(YES) for many rows in one call: risk-table lookups where possible, one flat-ensemble pass for the rest
+    X = np.asarray(X, dtype=np.float32)
+    if risk_table is None:
+        return engine.predict(X)[1]
+    proba, hit = risk_table.lookup_batch(X)
+    if not hit.all():
+        proba[~hit] = engine.predict(X[~hit])[1]
+    return proba
+
+# one small vector per (model, inputs); capped so long-running servers don't grow without bound
+@st.cache_data(max_entries=4096)
+def explain_patient(_explainer, fingerprint, row):
+    return _explainer.shap_values(np.array(row, dtype=np.float32))[0]
+
+# One compact frame per process, shared by every session and rerun (cache_data
+# would unpickle a fresh copy on each call). Treat it as read-only: derive
+# views/selections, never assign into it. read_survey() picks up an up-to-date
+# columnar copy (python survey.py convert) instead of parsing the CSV.
+# Everything derived from the survey is keyed on the CSV's content digest
+# (memoized on size/mtime), so an edited CSV replaces the frame, the index and
+# the stats together; max_entries=1 drops the previous version.
+@st.cache_resource(max_entries=1)
+def load_data(csv_digest):
+    metrics.inc("lung_app_cache_miss_total", resource="load_data")
+    return read_survey(p(RAW_CSV))
+
+csv_digest = file_digest(p(RAW_CSV))
+with metrics.timer(STAGE, stage="load_data"):
+    df_raw = load_data(csv_digest)
+
+@st.cache_resource(max_entries=1)
+def load_similarity_index(csv_digest):
+    return SymptomIndex.from_frame(load_data(csv_digest))
+
+sim_index = load_similarity_index(csv_digest)
+
+# Data Explorer aggregates, recomputed only when the CSV content changes
+@st.cache_data(max_entries=1)
+def load_explorer_stats(csv_digest):
+    return compute_explorer_stats(load_data(csv_digest))
+
+explorer = load_explorer_stats(csv_digest)
 
 # ── THEME ──────────────────────────────────────────────────────────────────────
 st.markdown("""
@@ -292,14 +420,16 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# ═══════════════════════════════════════════════════════════════════════════════
-tabs = st.tabs(["📖 Introduction", "📊 Data Explorer", "🌲 XGBoost Explained", "📈 Model Performance", "🔍 Predict Risk"])
-# ═══════════════════════════════════════════════════════════════════════════════
+# Each tab renders inside its own fragment: a widget change in one tab reruns
+# only that tab. Tabs are lazy — only the open tab's content is built.
 
 # ─────────────────────────────────────────────────────────────────────────────
 # TAB 1 — INTRODUCTION
 # ─────────────────────────────────────────────────────────────────────────────
-with tabs[0]:
+@st.fragment
+@exported
+@metrics.timed(STAGE, stage="render_intro")
+def render_intro():
     c1, c2 = st.columns([3, 2])
     with c1:
         st.markdown('<div class="sec-head">What Is This System?</div>', unsafe_allow_html=True)
@@ -373,7 +503,10 @@ with tabs[0]:
 # ─────────────────────────────────────────────────────────────────────────────
 # TAB 2 — DATA EXPLORER
 # ─────────────────────────────────────────────────────────────────────────────
-with tabs[1]:
+@st.fragment
+@exported
+@metrics.timed(STAGE, stage="render_explorer")
+def render_explorer():
     st.markdown('<div class="sec-head">Dataset Overview</div>', unsafe_allow_html=True)
     st.markdown('<div class="sec-subhead">309 patient survey records · 15 features · No missing values · Binary classification target</div>', unsafe_allow_html=True)
 
@@ -400,9 +533,8 @@ with tabs[1]:
         <div class="card card-accent">
         <b>Age Statistics</b><br><br>
         """, unsafe_allow_html=True)
-        age_stats = df_raw['AGE'].describe()
         for label, key in [("Min Age","min"),("Mean Age","mean"),("Median","50%"),("Max Age","max")]:
-            val = age_stats[key]
+            val = explorer['age'][key]
             st.markdown(f"""
             <div style="display:flex;justify-content:space-between;padding:6px 0;border-bottom:1px solid #1e2535;">
               <span style="color:#94a3b8;font-size:0.85rem;">{label}</span>
@@ -415,9 +547,8 @@ with tabs[1]:
         <div class="card card-green">
         <b>Gender Split</b><br><br>
         """, unsafe_allow_html=True)
-        gd = df_raw['GENDER'].value_counts()
-        for g, cnt in gd.items():
-            pct = cnt/len(df_raw)*100
+        for g, cnt in explorer['gender_counts'].items():
+            pct = cnt/explorer['n_rows']*100
             color = "#8b5cf6" if g=="M" else "#ec4899"
             st.markdown(f"""
             <b style="color:{'#8b5cf6' if g=='M' else '#ec4899'}!important;">{'Male' if g=='M' else 'Female'}</b>: {cnt} ({pct:.1f}%)<br>
@@ -429,17 +560,8 @@ with tabs[1]:
     st.markdown('<div class="sec-head">🦠 Symptom Prevalence Among Lung Cancer Patients</div>', unsafe_allow_html=True)
     st.markdown('<div class="sec-subhead">Percentage of lung cancer patients (YES) who reported each symptom (value=2)</div>', unsafe_allow_html=True)
 
-    df2 = df_raw.copy()
-    df2.columns = df2.columns.str.strip()
-    binary_cols = [c for c in df2.columns if c not in ['GENDER','AGE','LUNG_CANCER']]
-    yes_patients = df2[df2['LUNG_CANCER']=='YES']
-    no_patients  = df2[df2['LUNG_CANCER']=='NO']
-
-    symptom_data = []
-    for col in binary_cols:
-        yes_rate = (yes_patients[col]==2).mean()*100
-        no_rate  = (no_patients[col]==2).mean()*100
-        symptom_data.append((col.replace(' ','_'), yes_rate, no_rate))
+    symptom_data = [(col.replace(' ','_'), yes_rate, no_rate)
+                    for col, (yes_rate, no_rate) in explorer['prevalence'].items()]
     symptom_data.sort(key=lambda x: x[1], reverse=True)
 
     c1, c2 = st.columns(2)
@@ -475,12 +597,8 @@ with tabs[1]:
 
     # Correlation table
     st.markdown('<div class="sec-head">🔗 Feature Correlation with Lung Cancer</div>', unsafe_allow_html=True)
-    df_corr = df2.copy()
-    df_corr['target'] = (df_corr['LUNG_CANCER']=='YES').astype(int)
-    df_corr['GENDER'] = (df_corr['GENDER']=='M').astype(int)
     corr_data = []
-    for col in ['AGE','GENDER'] + binary_cols:
-        c_val = df_corr[col].corr(df_corr['target'])
+    for col, c_val in explorer['correlation'].items():
         corr_data.append({'Feature': col.strip(), 'Correlation': round(c_val, 4),
                           'Strength': '🔴 Strong' if abs(c_val)>0.25 else '🟡 Moderate' if abs(c_val)>0.1 else '⚪ Weak',
                           'Direction': '⬆️ Positive' if c_val>0 else '⬇️ Negative'})
@@ -500,7 +618,10 @@ with tabs[1]:
 # ─────────────────────────────────────────────────────────────────────────────
 # TAB 3 — XGBOOST EXPLAINED
 # ─────────────────────────────────────────────────────────────────────────────
-with tabs[2]:
+@st.fragment
+@exported
+@metrics.timed(STAGE, stage="render_xgboost")
+def render_xgboost():
     st.markdown('<div class="sec-head">🌲 What is XGBoost?</div>', unsafe_allow_html=True)
 
     st.markdown("""
@@ -597,24 +718,35 @@ with tabs[2]:
 # ─────────────────────────────────────────────────────────────────────────────
 # TAB 4 — MODEL PERFORMANCE
 # ─────────────────────────────────────────────────────────────────────────────
-with tabs[3]:
+@st.fragment
+@exported
+@metrics.timed(STAGE, stage="render_performance")
+def render_performance():
+    arts = current_models()[2]
     st.markdown('<div class="sec-head">📈 Performance Metrics Explained</div>', unsafe_allow_html=True)
 
     cr = arts['classification_report']
+    boot = arts.get('bootstrap')   # bootstrap CIs — absent in artifacts from older training runs
+    def ci(name, scale=100, fmt=".1f"):
+        if boot is None:
+            return ""
+        m = boot['metrics'][name]
+        return f"{boot['ci']:.0%} CI {m['lo']*scale:{fmt}} – {m['hi']*scale:{fmt}}"
     m1, m2, m3, m4, m5 = st.columns(5)
     metric_boxes = [
-        (m1, "Accuracy", f"{arts['accuracy']*100:.1f}%", "Overall correct predictions out of 62 test patients"),
-        (m2, "AUC-ROC", f"{arts['auc']:.3f}", "Area under ROC curve — 0.92 = excellent discrimination"),
-        (m3, "Precision (YES)", f"{cr['1']['precision']*100:.1f}%", "When model says YES, it's right this % of time"),
-        (m4, "Recall (YES)", f"{cr['1']['recall']*100:.1f}%", "% of actual cancer patients correctly identified"),
-        (m5, "F1-Score (YES)", f"{cr['1']['f1-score']*100:.1f}%", "Harmonic mean of precision and recall"),
+        (m1, "Accuracy", f"{arts['accuracy']*100:.1f}%", ci("accuracy"), "Overall correct predictions out of 62 test patients"),
+        (m2, "AUC-ROC", f"{arts['auc']:.3f}", ci("auc", 1, ".3f"), "Area under ROC curve — 0.92 = excellent discrimination"),
+        (m3, "Precision (YES)", f"{cr['1']['precision']*100:.1f}%", ci("precision"), "When model says YES, it's right this % of time"),
+        (m4, "Recall (YES)", f"{cr['1']['recall']*100:.1f}%", ci("recall"), "% of actual cancer patients correctly identified"),
+        (m5, "F1-Score (YES)", f"{cr['1']['f1-score']*100:.1f}%", ci("f1"), "Harmonic mean of precision and recall"),
     ]
-    for col, label, val, desc in metric_boxes:
+    for col, label, val, interval, desc in metric_boxes:
         with col:
             st.markdown(f"""
             <div class="stat-box" style="margin-bottom:8px;">
               <div class="sval" style="font-size:1.8rem;">{val}</div>
               <div class="slbl">{label}</div>
+              <div style="font-size:0.72rem;color:#a78bfa;font-family:'DM Mono',monospace;margin-top:4px;">{interval}</div>
             </div>
             <div style="font-size:0.75rem;color:#64748b;text-align:center;">{desc}</div>
             """, unsafe_allow_html=True)
@@ -712,6 +844,33 @@ with tabs[3]:
             """, unsafe_allow_html=True)
         st.markdown("</div>", unsafe_allow_html=True)
 
+    if boot is not None:
+        st.markdown('<div class="sec-head">🎯 How Stable Are These Numbers?</div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="sec-subhead">{boot["n_boot"]:,} bootstrap resamples of the {tn+fp+fn+tp} test patients — '
+                    f'median curve with its {boot["ci"]:.0%} band</div>', unsafe_allow_html=True)
+        c1, c2 = st.columns(2)
+        with c1:
+            st.markdown("**ROC curve** (True Positive Rate vs False Positive Rate)")
+            roc = boot['roc']
+            st.line_chart(pd.DataFrame({"lower": roc['tpr_lo'], "median": roc['tpr_median'], "upper": roc['tpr_hi']},
+                                       index=pd.Index(roc['fpr'], name="False Positive Rate")),
+                          color=["#64748b", "#8b5cf6", "#64748b"], height=300)
+        with c2:
+            st.markdown("**Precision–Recall curve** (YES class)")
+            pr = boot['pr']
+            st.line_chart(pd.DataFrame({"lower": pr['precision_lo'], "median": pr['precision_median'], "upper": pr['precision_hi']},
+                                       index=pd.Index(pr['recall'], name="Recall")),
+                          color=["#64748b", "#8b5cf6", "#64748b"], height=300)
+        auc_ci = boot['metrics']['auc']
+        st.markdown(f"""
+        <div class="card card-amber">
+        <b>💡 Why intervals?</b> The test split has only {tn+fp+fn+tp} patients ({tn+fp} of them NO), so a single
+        misclassified patient moves accuracy by {100/(tn+fp+fn+tp):.1f} points. Resampling those patients with replacement
+        shows the plausible range: AUC could be anywhere from <b>{auc_ci['lo']:.3f}</b> to <b>{auc_ci['hi']:.3f}</b>
+        on another sample of this size.
+        </div>
+        """, unsafe_allow_html=True)
+
     # Feature Importance
     st.markdown('<div class="sec-head">🎯 Feature Importance (XGBoost Gain)</div>', unsafe_allow_html=True)
     st.markdown('<div class="sec-subhead">How much each feature reduces prediction error across all 200 trees</div>', unsafe_allow_html=True)
@@ -818,7 +977,11 @@ with tabs[3]:
 # ─────────────────────────────────────────────────────────────────────────────
 # TAB 5 — PREDICT
 # ─────────────────────────────────────────────────────────────────────────────
-with tabs[4]:
+@st.fragment
+@exported
+@metrics.timed(STAGE, stage="render_predict")
+def render_predict():
+    snapshot, engine, arts, risk_table, replicas, explainer = current_models()
     st.markdown('<div class="sec-head">🔍 Real-Time Risk Prediction</div>', unsafe_allow_html=True)
     st.markdown('<div class="sec-subhead">Enter the patient\'s profile below — all symptom questions are binary (Yes/No)</div>', unsafe_allow_html=True)
 
@@ -888,12 +1051,25 @@ with tabs[4]:
         # Build input array
         gender_enc = 1 if gender_in == "Male" else 0
         input_row  = [gender_enc, age_in] + [symptom_inputs[c] for c in binary_cols_clean]
-        feature_names = arts['feature_names']
-        input_df   = pd.DataFrame([input_row], columns=feature_names)
-        pred       = model.predict(input_df)[0]
-        proba      = model.predict_proba(input_df)[0]
-        risk_pct   = proba[1] * 100
-        safe_pct   = proba[0] * 100
+        metrics.inc("lung_app_predictions_total")
+        with metrics.timer(STAGE, stage="predict"):
+            p_yes = risk_table.lookup(input_row) if risk_table is not None else None
+            source = "risk_table" if p_yes is not None else "model"
+            if p_yes is None:
+                labels, p1 = engine.predict(np.array([input_row], dtype=np.float32))
+                pred, p_yes = int(labels[0]), float(p1[0])
+            else:
+                pred = int(p_yes > 0.5)
+        drift.MONITOR.observe(input_row)      # input-drift sketch (drift.py), a few µs
+        ctx = get_script_run_ctx()
+        audit_log().record(input_row, p_yes, pred, snapshot.version, snapshot.value["fingerprint"],
+                           session=ctx.session_id if ctx else None, source=source)
+        risk_pct   = p_yes * 100
+        safe_pct   = (1 - p_yes) * 100
+        if replicas is not None:
+            # all K replicas in one fused traversal → mean and 90% interval across replicas
+            with metrics.timer(STAGE, stage="replicas"):
+                bag_mean, bag_lo, bag_hi = (v[0] * 100 for v in replicas.predict_interval(np.array([input_row], dtype=np.float32)))
 
         st.markdown("---")
         st.markdown("### 🧾 Prediction Result")
@@ -946,30 +1122,58 @@ with tabs[4]:
             </div>
             </div>
             """, unsafe_allow_html=True)
+            if replicas is not None:
+                st.markdown(f"""
+                <div class="card card-accent">
+                <b>🎲 How Stable Is This Estimate?</b><br><br>
+                {replicas.k} bagged replicas (each trained on a resample of the training patients) give
+                <b>{bag_mean:.1f}%</b> on average, 90% of them between <b>{bag_lo:.1f}%</b> and <b>{bag_hi:.1f}%</b>.
+                <div class="bar-bg" style="position:relative;margin-top:10px;">
+                  <div style="position:absolute;left:{bag_lo}%;width:{max(bag_hi - bag_lo, 0.5)}%;height:20px;border-radius:8px;background:rgba(139,92,246,0.45);"></div>
+                  <div style="position:absolute;left:{risk_pct}%;width:3px;height:20px;background:#ef4444;"></div>
+                </div>
+                <div style="font-size:0.78rem;color:#94a3b8;margin-top:6px;">
+                  {'A wide band means patients like this were rare or mixed in training — treat the number with caution.' if bag_hi - bag_lo > 30 else 'The replicas broadly agree on this profile.'}
+                </div>
+                </div>
+                """, unsafe_allow_html=True)
 
-        # Risk Factor Analysis
+        # Risk Factor Analysis — this patient's own additive contributions (log-odds)
         st.markdown("### 🔬 Risk Factor Analysis")
         c1, c2 = st.columns(2)
 
         active_symptoms  = [k for k,v in symptom_inputs.items() if v==1]
         inactive_symptoms = [k for k,v in symptom_inputs.items() if v==0]
-
-        # Get feature importances for context
-        fi_dict = arts['feature_importances']
+        factor_labels = {'GENDER': f"⚧ Gender ({gender_in})", 'AGE': f"🎂 Age ({age_in})", **symptom_labels}
+
+        if explainer is not None:
+            with metrics.timer(STAGE, stage="explain"):
+                phi = dict(zip(engine.feature_names, explain_patient(explainer, snapshot.value["fingerprint"], tuple(input_row))))
+            raising  = sorted([k for k in phi if phi[k] > 0], key=lambda k: phi[k], reverse=True)
+            lowering = sorted([k for k in phi if phi[k] < 0], key=lambda k: phi[k])
+            fmt_up = fmt_down = lambda k: f"{phi[k]:+.2f} log-odds"
+            head_up, head_down = "🔴 Raising This Patient's Risk", "🟢 Lowering This Patient's Risk"
+        else:
+            # bundle without node cover: fall back to global importances
+            fi_dict = arts['feature_importances']
+            raising  = sorted(active_symptoms, key=lambda x: fi_dict.get(x,0), reverse=True)
+            lowering = sorted(inactive_symptoms, key=lambda x: fi_dict.get(x,0), reverse=True)[:7]
+            fmt_up   = lambda k: f"importance: {fi_dict.get(k,0)*100:.1f}%"
+            fmt_down = lambda k: "absent: ✓"
+            head_up, head_down = "🔴 Active Risk Factors", "🟢 Protective (Not Present) Factors"
 
         with c1:
             st.markdown(f"""
             <div class="card card-red">
-            <b>🔴 Active Risk Factors ({len(active_symptoms)})</b><br><br>
+            <b>{head_up} ({len(raising)})</b><br><br>
             """, unsafe_allow_html=True)
-            if active_symptoms:
-                for sym in sorted(active_symptoms, key=lambda x: fi_dict.get(x,0), reverse=True):
-                    imp = fi_dict.get(sym, 0)
-                    label = symptom_labels.get(sym, sym)
+            if raising:
+                for sym in raising:
+                    label = factor_labels.get(sym, sym)
                     st.markdown(f"""
                     <div style="display:flex;justify-content:space-between;padding:6px 0;border-bottom:1px solid #1e2535;">
                       <span style="font-size:0.85rem;">{label}</span>
-                      <span style="color:#f87171;font-family:'DM Mono',monospace;font-size:0.78rem;">importance: {imp*100:.1f}%</span>
+                      <span style="color:#f87171;font-family:'DM Mono',monospace;font-size:0.78rem;">{fmt_up(sym)}</span>
                     </div>
                     """, unsafe_allow_html=True)
             else:
@@ -979,30 +1183,68 @@ with tabs[4]:
         with c2:
             st.markdown(f"""
             <div class="card card-green">
-            <b>🟢 Protective (Not Present) Factors ({len(inactive_symptoms)})</b><br><br>
+            <b>{head_down} ({len(lowering)})</b><br><br>
             """, unsafe_allow_html=True)
-            for sym in sorted(inactive_symptoms, key=lambda x: fi_dict.get(x,0), reverse=True)[:7]:
-                imp = fi_dict.get(sym, 0)
-                label = symptom_labels.get(sym, sym)
+            for sym in lowering:
+                label = factor_labels.get(sym, sym)
                 st.markdown(f"""
                 <div style="display:flex;justify-content:space-between;padding:6px 0;border-bottom:1px solid #1e2535;">
                   <span style="font-size:0.85rem;">{label}</span>
-                  <span style="color:#4ade80;font-family:'DM Mono',monospace;font-size:0.78rem;">absent: ✓</span>
+                  <span style="color:#4ade80;font-family:'DM Mono',monospace;font-size:0.78rem;">{fmt_down(sym)}</span>
                 </div>
                 """, unsafe_allow_html=True)
             st.markdown("</div>", unsafe_allow_html=True)
 
+        if explainer is not None:
+            st.markdown(f"""
+            <div class="card" style="font-size:0.85rem;color:#94a3b8;">
+            Exact TreeSHAP contributions: the average training patient starts at
+            <b>{explainer.expected_value:+.2f}</b> log-odds; adding every factor above gives this patient's
+            <b>{explainer.expected_value + sum(phi.values()):+.2f}</b> → {risk_pct:.1f}%.
+            </div>
+            """, unsafe_allow_html=True)
+
+        # What-if sensitivity: every slider age + each symptom flipped, scored as one matrix
+        st.markdown("### 🎚️ What-If Sensitivity")
+        sweep_ages = np.arange(21, 88)
+        flips      = np.arange(len(binary_cols_clean))
+        base_row   = np.array(input_row, dtype=np.float32)
+        X_sweep    = np.repeat(base_row[None, :], len(sweep_ages) + len(flips), axis=0)
+        X_sweep[:len(sweep_ages), 1] = sweep_ages
+        X_sweep[len(sweep_ages) + flips, 2 + flips] = 1 - base_row[2 + flips]
+        with metrics.timer(STAGE, stage="what_if"):
+            p_sweep = predict_batch(X_sweep, engine, risk_table) * 100
+        p_age, p_flip = p_sweep[:len(sweep_ages)], p_sweep[len(sweep_ages):] - risk_pct
+
+        c1, c2 = st.columns(2)
+        with c1:
+            st.markdown(f"**🎂 Risk across ages** (everything else as entered; now {age_in})")
+            st.line_chart(pd.DataFrame({"Lung cancer risk (%)": p_age}, index=pd.Index(sweep_ages, name="Age")),
+                          height=300)
+            st.markdown(f"""
+            <div style="font-size:0.8rem;color:#94a3b8;">
+            Lowest {p_age.min():.1f}% at age {sweep_ages[p_age.argmin()]} · highest {p_age.max():.1f}% at age {sweep_ages[p_age.argmax()]}
+            </div>
+            """, unsafe_allow_html=True)
+        with c2:
+            st.markdown("**🔁 Flip one symptom**")
+            for j in np.argsort(-np.abs(p_flip), kind="stable"):
+                col   = binary_cols_clean[j]
+                delta = p_flip[j]
+                was   = "Yes → No" if symptom_inputs[col] else "No → Yes"
+                color = "#f87171" if delta > 0 else "#4ade80"
+                st.markdown(f"""
+                <div style="display:flex;justify-content:space-between;padding:4px 0;border-bottom:1px solid #1e2535;">
+                  <span style="font-size:0.82rem;">{symptom_labels[col]} <span style="color:#64748b;">({was})</span></span>
+                  <span style="color:{color};font-family:'DM Mono',monospace;font-size:0.78rem;">{delta:+.1f} pp → {p_sweep[len(sweep_ages) + j]:.1f}%</span>
+                </div>
+                """, unsafe_allow_html=True)
+
         # Similar patients
         st.markdown("### 👥 Similar Patients in Training Data")
-        df_sim = df_raw.copy()
-        df_sim.columns = df_sim.columns.str.strip()
-        active_count = len(active_symptoms)
-        symptom_match = []
-        for _, row in df_sim.iterrows():
-            matches = sum(1 for s in active_symptoms if row.get(s, 1) == 2)
-            symptom_match.append(matches)
-        df_sim['_match'] = symptom_match
-        similar = df_sim.nlargest(8, '_match')[['GENDER','AGE','LUNG_CANCER']].copy()
+        with metrics.timer(STAGE, stage="similar_patients"):
+            top_rows = sim_index.top_k(symptom_mask(active_symptoms), k=8, age=age_in)
+        similar = df_raw.iloc[top_rows][['GENDER','AGE','LUNG_CANCER']].copy()
         similar['LUNG_CANCER'] = similar['LUNG_CANCER'].map({'YES':'🔴 YES','NO':'🟢 NO'})
         similar.columns = ['Gender','Age','Lung Cancer']
         similar = similar.reset_index(drop=True); similar.index += 1
@@ -1042,6 +1284,115 @@ with tabs[4]:
         </div>
         """, unsafe_allow_html=True)
 
+# ─────────────────────────────────────────────────────────────────────────────
+# TAB 6 — BATCH SCREENING
+# ─────────────────────────────────────────────────────────────────────────────
+# Uploads are scored on a small process-wide thread pool (score_batch.BatchJob);
+# script runs only start a job and poll it, so a file of any size never holds
+# the websocket or another session's rerun.
+@st.cache_resource
+def batch_pool():
+    return ThreadPoolExecutor(max_workers=int(os.environ.get("LUNG_BATCH_WORKERS", "2")),
+                              thread_name_prefix="batch")
+
+def batch_summary(job):
+    scored = max(job.rows - job.invalid, 1)
+    rate = job.rows / job.elapsed() if job.elapsed() > 0 else 0
+    b1, b2, b3, b4 = st.columns(4)
+    for col, val, label in ((b1, f"{job.rows:,}", "Rows Scored"),
+                            (b2, f"{job.positive:,} ({job.positive/scored*100:.1f}%)", "Predicted YES"),
+                            (b3, f"{job.invalid:,}", "Invalid Rows"),
+                            (b4, f"{rate:,.0f}/s", "Throughput")):
+        with col:
+            st.markdown(f"""
+            <div class="stat-box" style="margin-bottom:8px;">
+              <div class="sval" style="font-size:1.5rem;">{val}</div>
+              <div class="slbl">{label}</div>
+            </div>""", unsafe_allow_html=True)
+    preview = job.preview()
+    if preview is not None:
+        cols = [PRED_COL, PROBA_COL] + [c for c in preview.columns if c not in (PRED_COL, PROBA_COL)]
+        st.dataframe(preview[cols], use_container_width=True, height=280)
+
+@st.fragment(run_every=1.0)
+@exported
+def batch_progress():
+    job = st.session_state.get("batch_job")
+    if job is None:
+        return
+    if job.done:
+        st.rerun()                  # one full run swaps this live view for the final one
+    text = ("⏳ Queued behind other uploads…" if job.started is None
+            else f"Reading {job.name}… {job.elapsed():.1f}s" if job.total is None
+            else f"Scoring {job.name}: {job.rows:,} of ~{job.total:,} rows · {job.elapsed():.1f}s")
+    st.progress(job.progress(), text=text)
+    batch_summary(job)
+    if st.button("⏹️ Cancel", key="batch_cancel"):
+        job.cancelled = True
+
+@st.fragment
+@exported
+@metrics.timed(STAGE, stage="render_batch")
+def render_batch():
+    _, engine, _, risk_table, _, _ = current_models()
+    st.markdown('<div class="sec-head">📂 Batch Screening</div>', unsafe_allow_html=True)
+    st.markdown('<div class="sec-subhead">Upload a screening spreadsheet in the survey format (M/F gender, age, symptoms coded 1 = No / 2 = Yes) — every row is scored in the background</div>', unsafe_allow_html=True)
+
+    up = st.file_uploader("Screening file", type=[e.lstrip(".") for e in UPLOAD_EXTS], key="batch_file")
+    job = st.session_state.get("batch_job")
+    running = job is not None and not job.done
+    if up is not None and st.button("▶️ Score File", type="primary", disabled=running):
+        data = up.getvalue()
+        try:
+            head = clean_columns(next(read_upload(data, up.name, nrows=5)[0]))
+        except ImportError:
+            st.error("Excel uploads need the openpyxl package — save the sheet as CSV instead.")
+            return
+        except Exception as e:
+            st.error(f"Could not read {up.name}: {e}")
+            return
+        missing = [c for c in FEATURE_NAMES if c not in head.columns]
+        if missing:
+            st.error(f"{up.name} is missing required columns: {', '.join(missing)}")
+            return
+        job = BatchJob(data, up.name, engine, risk_table, monitor=drift.MONITOR)
+        batch_pool().submit(job.run)
+        st.session_state["batch_job"] = job
+        metrics.inc("lung_app_batch_jobs_total")
+        running = True
+
+    if job is None:
+        st.markdown(f"""
+        <div class="card" style="font-size:0.88rem;">
+        Required columns: <b>{', '.join(FEATURE_NAMES)}</b>. Extra columns (IDs, names) are kept in the
+        output; rows with missing or out-of-range values are marked <b>INVALID</b> instead of being scored.
+        </div>""", unsafe_allow_html=True)
+        return
+    if running:
+        batch_progress()
+        return
+
+    if job.error:
+        st.error(f"Scoring {job.name} failed after {job.rows:,} rows — {job.error}")
+    elif job.cancelled:
+        st.warning(f"Cancelled after {job.rows:,} rows — the download holds the rows scored so far.")
+    else:
+        st.success(f"✅ Scored {job.rows:,} rows of {job.name} in {job.elapsed():.1f}s")
+    batch_summary(job)
+    if job.rows:
+        st.download_button("⬇️ Download Scored File", job.to_csv, mime="text/csv",
+                           file_name=f"{os.path.splitext(job.name)[0]}_scored.csv")
+
+# ═══════════════════════════════════════════════════════════════════════════════
+tabs = st.tabs(["📖 Introduction", "📊 Data Explorer", "🌲 XGBoost Explained", "📈 Model Performance", "🔍 Predict Risk",
+                "📂 Batch Screening"], key="main_tab", on_change="rerun")
+# ═══════════════════════════════════════════════════════════════════════════════
+for tab, render in zip(tabs, [render_intro, render_explorer, render_xgboost, render_performance, render_predict,
+                              render_batch]):
+    if tab.open:
+        with tab:
+            render()
+
 # ── FOOTER ───────────────────────────────────────────────────────────────────
 st.markdown("""
 <div style="text-align:center;padding:32px 0 16px;color:#334155;font-size:0.8rem;font-family:'DM Mono',monospace;border-top:1px solid #1e2535;margin-top:40px;">
@@ -1049,3 +1400,88 @@ st.markdown("""
   <br>Built with Streamlit & Scikit-learn · Dataset: Lung Cancer Survey (Kaggle)
 </div>
 """, unsafe_allow_html=True)
+
+# ── ADMIN: hot-path metrics (off unless LUNG_ADMIN_TOKEN is set; then ?admin=<token>) ──
+metrics.observe(STAGE, time.perf_counter() - _run_t0, stage="script_run")
+metrics.inc("lung_app_script_runs_total")
+export_metrics()
+
+def is_admin():
+    token = os.environ.get("LUNG_ADMIN_TOKEN")
+    given = st.query_params.get("admin")
+    return bool(token) and given is not None and hmac.compare_digest(given.encode(), token.encode())
+
+if is_admin():
+    st.markdown('<div class="sec-head">🛠️ Admin · Hot-Path Metrics</div>', unsafe_allow_html=True)
+    st.markdown('<div class="sec-subhead">Since this server process started, across all sessions — bucketed, so p50/p99 are upper bounds</div>', unsafe_allow_html=True)
+    stage_rows = [{"Stage": dict(labels)["stage"], "Calls": n, "Mean (ms)": round(mean * 1e3, 3),
+                   "p50 ≤ (ms)": p50 * 1e3, "p99 ≤ (ms)": p99 * 1e3}
+                  for labels, (n, mean, p50, p99) in metrics.REGISTRY.summary(STAGE).items()]
+    st.dataframe(pd.DataFrame(stage_rows).sort_values("Mean (ms)", ascending=False),
+                 use_container_width=True, hide_index=True)
+    # input drift: live sketch (drift.MONITOR) vs the serving model's training reference
+    drift_rep = drift.report()
+    prom = metrics.REGISTRY.prometheus()
+    g = metrics.REGISTRY.gauges
+    st.markdown(f"""
+    <div class="card" style="font-family:'DM Mono',monospace;font-size:0.82rem;">
+    RSS now: <b>{g.get(("process_resident_memory_bytes", ()), 0)/2**20:.1f} MB</b> ·
+    peak: <b>{g.get(("process_max_resident_memory_bytes", ()), 0)/2**20:.1f} MB</b> ·
+    script runs: <b>{metrics.REGISTRY.counters.get(("lung_app_script_runs_total", ()), 0)}</b> ·
+    predictions: <b>{metrics.REGISTRY.counters.get(("lung_app_predictions_total", ()), 0)}</b>
+    </div>
+    """, unsafe_allow_html=True)
+    st.markdown(f"""
+    <div class="card" style="font-family:'DM Mono',monospace;font-size:0.82rem;">
+    model version: <b>{snapshot.version}</b> (fingerprint {engine.fingerprint()[:12]}) ·
+    loaded: <b>{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot.loaded_at))}</b> ·
+    hot reloads: <b>{store.reloads}</b> · rejected: <b>{store.failures}</b>
+    {f'<br>last rejected: <b>{store.last_error}</b>' if store.last_error else ''}
+    </div>
+    """, unsafe_allow_html=True)
+    audit = audit_log()
+    st.markdown(f"""
+    <div class="card" style="font-family:'DM Mono',monospace;font-size:0.82rem;">
+    audit log: <b>{os.path.basename(audit.path)}</b> · written: <b>{audit.written:,}</b> ·
+    queued: <b>{audit.pending}</b> · flushes: <b>{audit.flushes}</b> · write errors: <b>{audit.errors}</b>
+    {f'<br>last write error: <b>{audit.last_error}</b>' if audit.last_error else ''}
+    </div>
+    """, unsafe_allow_html=True)
+    st.download_button("⬇️ Prometheus text format", prom, file_name="lung_metrics.prom", mime="text/plain")
+
+    st.markdown('<div class="sec-head">🧭 Admin · Input Drift</div>', unsafe_allow_html=True)
+    if drift_rep is None:
+        st.info("No drift reference in the model artifacts — retrain, or run `python train_model.py --reference-only`.")
+    else:
+        st.markdown(f'<div class="sec-subhead">{drift_rep["n"]:,} scored inputs since '
+                    f'{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(drift_rep["since"]))} vs '
+                    f'{drift_rep["ref_n"]:,} training rows — PSI ≥ {drift.PSI_WARN} warn, ≥ {drift.PSI_ALERT} alert</div>',
+                    unsafe_allow_html=True)
+        if drift_rep["n"] == 0:
+            st.info("No inputs scored yet in this server process.")
+        else:
+            age = drift_rep["age"]
+            feat_rows = [{"Feature": r["feature"], "Training rate": round(r["ref_rate"], 3),
+                          "Live rate": round(r["live_rate"], 3), "PSI": round(r["psi"], 4),
+                          "KL": round(r["kl"], 4), "Status": drift.status(r["psi"])}
+                         for r in drift_rep["features"]]
+            feat_rows.append({"Feature": "AGE (histogram)", "Training rate": None, "Live rate": None,
+                              "PSI": round(age["psi"], 4), "KL": round(age["kl"], 4), "Status": drift.status(age["psi"])})
+            d1, d2 = st.columns([1.2, 1])
+            with d1:
+                st.dataframe(pd.DataFrame(feat_rows).sort_values("PSI", ascending=False),
+                             use_container_width=True, hide_index=True)
+            with d2:
+                edges = age["edges"]
+                bins = [f"<{edges[0]}"] + [f"{a}–{b - 1}" for a, b in zip(edges, edges[1:])] + [f"{edges[-1]}+"]
+                share = lambda c: np.asarray(c, dtype=float) / max(sum(c), 1)
+                st.bar_chart(pd.DataFrame({"Training": share(age["ref"]), "Live": share(age["live"])},
+                                          index=pd.Index(bins, name="Age")), stack=False, sort=False, height=260)
+                st.markdown("**Symptom pairs (joint co-occurrence), most drifted**")
+                st.dataframe(pd.DataFrame([{"Pair": " + ".join(r["pair"]), "Training rate": round(r["ref_rate"], 3),
+                                            "Live rate": round(r["live_rate"], 3), "PSI": round(r["psi"], 4),
+                                            "Status": drift.status(r["psi"])} for r in drift_rep["pairs"][:10]]),
+                             use_container_width=True, hide_index=True)
+        if st.button("♻️ Reset live drift window"):
+            drift.MONITOR.reset()
+            st.rerun()
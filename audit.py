@@ -0,0 +1,220 @@
+import argparse
+import atexit
+import collections
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import numpy as np
+import metrics
+from survey import FEATURE_NAMES
+
+# ── Append-only prediction audit log ─────────────────────────────────────────
+# record() is the only thing the request path pays: one tuple appended to an
+# in-memory deque (a few µs, no lock, no syscall, never touches disk). A daemon
+# writer thread drains it and appends to SQLite in WAL mode, one transaction
+# per batch of ≤ `batch_size` rows. The writer wakes when `batch_size` records
+# are waiting or every `flush_interval` seconds, whichever comes first — never
+# per record: on a single CPU a woken writer preempts the request thread, which
+# showed up as ms-scale stalls in the prediction p99.
+#
+# close() — registered with atexit, and called by the app's cache release —
+# drains whatever is still queued and commits it, so a clean shutdown loses
+# nothing. A hard kill can lose at most the unflushed tail (≤ one interval).
+# A failed write keeps its rows and retries them on the next wake. Triggers
+# reject UPDATE and DELETE on the table.
+#
+# python audit.py     → p50/p99 prediction latency: no audit vs queued vs synchronous writes
+
+AUDIT_DB       = os.environ.get("LUNG_AUDIT_DB", "lung_audit.db")
+BATCH_SIZE     = 256
+FLUSH_INTERVAL = 1.0         # seconds
+
+# one INTEGER column per model input (encoded: GENDER 1 = M, symptoms 1 = yes),
+# so rows bind straight from the queued tuple — no per-row encoding on the writer
+_INPUTS = ",\n".join(f'    "{c}" INTEGER NOT NULL' for c in FEATURE_NAMES)
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS predictions (
+    id            INTEGER PRIMARY KEY,
+    ts            REAL    NOT NULL,       -- unix time of the prediction
+    session       TEXT,                   -- Streamlit session id
+    model_version TEXT    NOT NULL,       -- model_store content version
+    fingerprint   TEXT,                   -- engine.fingerprint()
+    source        TEXT,                   -- "risk_table" or "model"
+    probability   REAL    NOT NULL,       -- P(YES)
+    prediction    INTEGER NOT NULL,
+{_INPUTS}
+);
+CREATE TRIGGER IF NOT EXISTS predictions_no_update BEFORE UPDATE ON predictions
+BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS predictions_no_delete BEFORE DELETE ON predictions
+BEGIN SELECT RAISE(ABORT, 'audit log is append-only'); END;
+"""
+_COLUMNS = ["ts", "session", "model_version", "fingerprint", "source", "probability", "prediction"] + FEATURE_NAMES
+_INSERT = "INSERT INTO predictions ({}) VALUES ({})".format(
+    ", ".join(f'"{c}"' for c in _COLUMNS), ", ".join("?" * len(_COLUMNS)))
+
+def connect(path):
+    con = sqlite3.connect(path, timeout=30)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")   # WAL + NORMAL: a commit survives a process crash
+    con.executescript(_SCHEMA)
+    return con
+
+class AuditLog:
+    def __init__(self, path=AUDIT_DB, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path, self.batch_size, self.flush_interval = path, batch_size, flush_interval
+        self.written = self.flushes = self.errors = 0
+        self.last_error = None
+        self._buf = collections.deque()        # append/popleft are atomic: no lock on the request path
+        self._retry = []                       # rows of a failed write, first in line next time
+        self._wake = threading.Event()
+        self._stopping = False
+        connect(path).close()                  # create the schema up front: a bad path fails here, not in the thread
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, values, probability, prediction, model_version, fingerprint=None, session=None, source=None):
+        # request path: enqueue one row and return. `values` = encoded inputs in FEATURE_NAMES order
+        self._buf.append((time.time(), session, model_version, fingerprint, source,
+                          float(probability), int(prediction), *map(int, values)))
+        if len(self._buf) >= self.batch_size:
+            self._wake.set()
+
+    @property
+    def pending(self):
+        return len(self._buf) + len(self._retry)
+
+    def _flush(self, con, batch):
+        t0 = time.perf_counter()
+        try:
+            with con:                          # one transaction per batch
+                con.executemany(_INSERT, batch)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            metrics.inc("lung_audit_write_errors_total")
+            traceback.print_exc()
+            return False
+        self.written += len(batch)
+        self.flushes += 1
+        metrics.observe("lung_audit_flush_seconds", time.perf_counter() - t0)
+        metrics.inc("lung_audit_records_total", len(batch))
+        return True
+
+    def _drain(self, con):
+        rows, self._retry = self._retry, []
+        while self._buf:
+            rows.append(self._buf.popleft())
+        for i in range(0, len(rows), self.batch_size):
+            if not self._flush(con, rows[i:i + self.batch_size]):
+                self._retry = rows[i:]
+                break
+        metrics.gauge("lung_audit_queue_depth", self.pending)
+
+    def _run(self):
+        con = connect(self.path)
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            stopping = self._stopping          # read before draining: rows recorded up to close() are included
+            self._drain(con)
+            if stopping:
+                break
+        con.close()
+
+    def close(self, timeout=30.0):
+        # drain and commit everything queued so far; idempotent
+        if self._stopping:
+            return
+        self._stopping = True
+        self._wake.set()
+        self._thread.join(timeout)
+        atexit.unregister(self.close)
+
+def count(path=AUDIT_DB):
+    con = sqlite3.connect(path)
+    try:
+        return con.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+    finally:
+        con.close()
+
+
+# ── Latency measurement ──────────────────────────────────────────────────────
+def _preemptions():
+    # involuntary context switches of the calling thread so far (Linux only, else 0)
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_THREAD).ru_nivcsw
+    except (ImportError, AttributeError, OSError):
+        return 0
+
+def measure(n=6_000, rate=500.0, block=250):
+    from bundle import BUNDLE_FILE, load_bundle
+    here = os.path.dirname(os.path.abspath(__file__))
+    engine, _ = load_bundle(os.path.join(here, BUNDLE_FILE))
+    rng = np.random.default_rng(0)
+    rows = [[int(rng.integers(2)), int(rng.integers(21, 88))] + rng.integers(2, size=13).tolist() for _ in range(1000)]
+
+    def lat(audit, start_at, n):
+        # predictions arrive `rate` per second (an open loop, like clicks); time only predict + audit
+        out, start, csw = [], time.perf_counter(), _preemptions()
+        for i in range(start_at, start_at + n):
+            row = rows[i % len(rows)]
+            wait = start + (i - start_at) / rate - time.perf_counter() if rate else 0
+            if wait > 0:
+                time.sleep(wait)
+            t0 = time.perf_counter()
+            labels, p1 = engine.predict(np.array([row], dtype=np.float32))
+            if audit is not None:
+                audit(row, float(p1[0]), int(labels[0]))
+            out.append(time.perf_counter() - t0)
+        return out, _preemptions() - csw
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queued = AuditLog(os.path.join(tmp, "queued.db"))
+        sync_con = connect(os.path.join(tmp, "sync.db"))
+        def sync(row, proba, pred):
+            with sync_con:
+                sync_con.execute(_INSERT, (time.time(), None, "bench", None, "model", proba, pred, *row))
+        modes = [
+            ("no audit", None),
+            ("queued (AuditLog)", lambda row, proba, pred: queued.record(row, proba, pred, "bench")),
+            ("synchronous commit", sync),
+        ]
+        runs = {label: [] for label, _ in modes}
+        csw = dict.fromkeys(runs, 0)
+        # short blocks, mode order rotated each block: VM noise drifts over seconds and
+        # would otherwise land on whichever mode happened to run during it
+        for b, start_at in enumerate(range(0, n, block)):
+            for label, audit in modes[b % 3:] + modes[:b % 3]:
+                out, c = lat(audit, start_at, min(block, n - start_at))
+                runs[label] += out
+                csw[label] += c
+        t0 = time.perf_counter()
+        queued.close()
+        drain = time.perf_counter() - t0
+        sync_con.close()
+        for label, x in runs.items():
+            x = np.array(x) * 1e6
+            print(f"{label:>20}: {len(x):7,} predictions · p50 {np.percentile(x, 50):7.1f} µs · "
+                  f"p99 {np.percentile(x, 99):7.1f} µs · max {x.max()/1e3:6.2f} ms · {csw[label]} preemptions")
+        print(f"queued log: {count(queued.path):,} rows on disk after close() ({drain*1e3:.1f} ms drain) · "
+              f"{queued.flushes} flushes · {queued.errors} errors")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Prediction audit log: latency benchmark, or count rows in a log")
+    ap.add_argument("--n", type=int, default=6_000, help="predictions per mode")
+    ap.add_argument("--block", type=int, default=250, help="predictions per mode before switching to the next")
+    ap.add_argument("--rate", type=float, default=500.0, help="predictions per second (0 = back to back)")
+    ap.add_argument("--count", metavar="DB", help="print the number of audited predictions in DB and exit")
+    args = ap.parse_args()
+    if args.count:
+        print(count(args.count))
+        sys.exit(0)
+    measure(args.n, args.rate, args.block)
@@ -0,0 +1,66 @@
+import numpy as np
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
+from sklearn.inspection import permutation_importance
+
+# ── Boosting backends ────────────────────────────────────────────────────────
+#   gbc      sklearn GradientBoostingClassifier — exact splits, single-threaded
+#   hist     sklearn HistGradientBoostingClassifier — binned (histogram) splits, multithreaded
+#   xgboost  xgboost XGBClassifier(tree_method="hist") — optional dependency
+#
+# make_model() takes one generic parameter dict (n_estimators, learning_rate,
+# max_depth, subsample, min_samples_split, random_state) and maps it per backend:
+#   gbc      all of them, as-is
+#   hist     n_estimators → max_iter, min_samples_split → min_samples_leaf (÷2);
+#            subsample is dropped — HistGB has no row subsampling, so the same
+#            dict trains on every row, not the 80% gbc sees with subsample=0.8
+#   xgboost  min_samples_split is dropped (no equivalent); the rest carry over
+# All flatten into the same FlatEnsemble, so the artifacts and bundle look
+# identical whichever was used.
+
+BACKENDS = ("gbc", "hist", "xgboost")
+BACKEND_LABELS = {"gbc": "XGBoost (GBC)", "hist": "XGBoost (Hist GBC)", "xgboost": "XGBoost (xgboost hist)"}
+BUDGET_PARAM = {"gbc": "n_estimators", "hist": "max_iter", "xgboost": "n_estimators"}
+
+def has_xgboost():
+    try:
+        import xgboost  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def available_backends():
+    return [b for b in BACKENDS if b != "xgboost" or has_xgboost()]
+
+def make_model(backend, params):
+    p = dict(params)
+    n_trees = p.get("n_estimators")
+    if backend == "gbc":
+        return GradientBoostingClassifier(**p)
+    if backend == "hist":
+        kw = dict(learning_rate=p.get("learning_rate", 0.1), max_depth=p.get("max_depth"),
+                  min_samples_leaf=max(1, p.get("min_samples_split", 20) // 2),
+                  early_stopping=False, random_state=p.get("random_state"))
+        if n_trees is not None:
+            kw["max_iter"] = n_trees
+        return HistGradientBoostingClassifier(**kw)
+    if backend == "xgboost":
+        if not has_xgboost():
+            raise SystemExit("❌ backend 'xgboost' needs the xgboost package (pip install xgboost)")
+        from xgboost import XGBClassifier
+        kw = dict(learning_rate=p.get("learning_rate", 0.1), max_depth=p.get("max_depth", 4),
+                  subsample=p.get("subsample", 1.0), tree_method="hist", n_jobs=-1,
+                  random_state=p.get("random_state", 0), eval_metric="logloss")
+        if n_trees is not None:
+            kw["n_estimators"] = n_trees
+        return XGBClassifier(**kw)
+    raise ValueError(f"Unknown backend {backend!r}; choose from {BACKENDS}")
+
+def feature_importances(model, X, y, random_state=42):
+    # impurity/gain importances where the backend has them, otherwise normalised permutation importance
+    fi = getattr(model, "feature_importances_", None)
+    if fi is not None:
+        return np.asarray(fi, dtype=np.float64)
+    r = permutation_importance(model, X, y, scoring="roc_auc", n_repeats=10,
+                               random_state=random_state, n_jobs=-1)
+    fi = np.clip(r.importances_mean, 0, None)
+    return fi / fi.sum() if fi.sum() > 0 else fi
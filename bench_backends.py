@@ -0,0 +1,75 @@
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+from backends import available_backends, make_model
+from flat_ensemble import FlatEnsemble
+from survey import FEATURE_NAMES, RAW_CSV, TARGET, clean_columns, encode_features
+from train_model import BASE_PARAMS
+
+# ── Backend benchmark: training time, inference latency, AUC vs data size ────
+# python bench_backends.py --sizes 1000 10000 100000 --json backends.json
+#
+# The real survey is split 80/20 first. The 80% is bootstrap-resampled (with
+# ±2 yr age jitter) up to each target size for training; AUC is always measured
+# on the untouched real 20%, so larger sizes cannot leak test rows into training.
+
+def upsample(X, y, n, rng):
+    idx = rng.integers(0, len(X), n)
+    Xs = X[idx].copy()
+    Xs[:, 1] = np.clip(Xs[:, 1] + rng.integers(-2, 3, n), 21, 87)
+    return Xs, y[idx]
+
+def timeit(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter(); fn(); times.append(time.perf_counter() - t0)
+    return float(np.median(times))
+
+def run(sizes, backends, batch_rows=100_000, seed=0):
+    df = clean_columns(pd.read_csv(RAW_CSV))
+    X, _ = encode_features(df)
+    y = (df[TARGET] == 'YES').to_numpy().astype(int)
+    X_tr, X_te, y_tr, y_te = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    rng = np.random.default_rng(seed)
+    batch = upsample(X_tr, y_tr, batch_rows, rng)[0]
+    one = pd.DataFrame(X_te[:1], columns=FEATURE_NAMES)
+    batch_df = pd.DataFrame(batch, columns=FEATURE_NAMES)
+
+    results = []
+    for n in sizes:
+        Xn, yn = upsample(X_tr, y_tr, n, rng)
+        Xn_df = pd.DataFrame(Xn, columns=FEATURE_NAMES)
+        for backend in backends:
+            model = make_model(backend, BASE_PARAMS)
+            t0 = time.perf_counter(); model.fit(Xn_df, yn); fit_s = time.perf_counter() - t0
+            engine = FlatEnsemble.from_model(model)
+            auc = roc_auc_score(y_te, engine.predict(X_te)[1])
+            row = {
+                "backend": backend, "rows": n, "fit_s": fit_s, "auc": auc,
+                "native_1row_ms": timeit(lambda: model.predict_proba(one), 50) * 1e3,
+                "flat_1row_ms": timeit(lambda: engine.predict(X_te[:1]), 200) * 1e3,
+                "native_batch_rows_s": batch_rows / timeit(lambda: model.predict_proba(batch_df), 3),
+                "flat_batch_rows_s": batch_rows / timeit(lambda: engine.predict(batch), 3),
+            }
+            results.append(row)
+            print(f"{backend:>8} {n:>9,} rows · fit {fit_s:7.2f}s · AUC {auc:.4f} · "
+                  f"1-row {row['native_1row_ms']:.3f}/{row['flat_1row_ms']:.3f} ms (native/flat) · "
+                  f"batch {row['native_batch_rows_s']:,.0f}/{row['flat_batch_rows_s']:,.0f} rows/s", flush=True)
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Compare boosting backends across data sizes")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    ap.add_argument("--backends", nargs="+", default=available_backends())
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    results = run(args.sizes, args.backends)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from bundle import BUNDLE_FILE, load_bundle
+from explorer_stats import compute_explorer_stats
+from similarity import SymptomIndex, symptom_mask
+from survey import BINARY_COLS, RAW_CSV, clean_columns, compact_frame, encode_features
+from synth_data import generate
+
+# ── Reproducible micro + macro benchmark suite ───────────────────────────────
+# python bench_suite.py --sizes 1000 100000 1000000 --json bench.json
+# python bench_suite.py --save-baseline bench_baseline.json         (record)
+# python bench_suite.py --baseline bench_baseline.json --tolerance 0.25
+#     → exit code 1 if any benchmark's median got slower than baseline × (1 + tolerance)
+#
+#   micro  load        cold bundle/pickle load in a fresh interpreter (what load_all() pays)
+#          predict     engine.predict_proba: one row, and a batch of each size
+#          similar     SymptomIndex build + top-k search over a registry of each size
+#          explorer    compute_explorer_stats over a registry of each size
+#   macro  app         app.py under streamlit.testing AppTest: cold run, rerun, every tab,
+#                      Predict click — against a copy of the app whose survey CSV is synthetic
+#
+# Synthetic registries come from synth_data.generate(seed), so every run sees
+# the same rows. Each benchmark reports the median and min of its repeats.
+
+APP_FILES = ("app.py", "bundle.py", "flat_ensemble.py", "risk_table.py", "similarity.py", "explorer_stats.py",
+             "survey.py", "treeshap.py", "metrics.py", "model_store.py", "score_batch.py", "drift.py", "audit.py",
+             BUNDLE_FILE, "lung_replicas.bundle", "lung_risk_table.npy", "lung_risk_table.json", "lung_xgb_model.pkl", "lung_artifacts.pkl")
+TABS = ["📊 Data Explorer", "🌲 XGBoost Explained", "📈 Model Performance", "🔍 Predict Risk", "📂 Batch Screening"]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def measure(fn, repeats, warmup=1):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter(); fn(); times.append(time.perf_counter() - t0)
+    return float(np.median(times)), float(np.min(times))
+
+def record(results, group, name, size, seconds, repeats):
+    med, best = seconds
+    results.append({"group": group, "name": name, "size": size, "median_s": med, "min_s": best, "repeats": repeats})
+    print(f"{group:>9} · {name:<28} {size if size is not None else '':>10} "
+          f"median {med*1e3:10.3f} ms · min {best*1e3:10.3f} ms", flush=True)
+
+def synth_registry(n, seed):
+    # compact raw-schema frame with stripped headers, as load_data() returns it
+    return compact_frame(clean_columns(pd.concat(generate(n, seed=seed, chunksize=max(n, 1)), ignore_index=True)))
+
+# ── micro ────────────────────────────────────────────────────────────────────
+_COLD = r"""
+import time, warnings
+warnings.filterwarnings("ignore")
+t0 = time.perf_counter()
+{load}
+print(time.perf_counter() - t0)
+"""
+_LOADS = {
+    "load_all (bundle)": "from bundle import load_bundle\nengine, header = load_bundle('lung_model.bundle')",
+    "load_all (pickles)": "import pickle\nfrom flat_ensemble import FlatEnsemble\n"
+                          "model = pickle.load(open('lung_xgb_model.pkl','rb'))\n"
+                          "arts = pickle.load(open('lung_artifacts.pkl','rb'))\n"
+                          "engine = FlatEnsemble.from_model(model)",
+}
+
+def bench_load(results, repeats):
+    for name, load in _LOADS.items():
+        runs = []
+        for _ in range(repeats):
+            out = subprocess.run([sys.executable, "-c", _COLD.format(load=load)], cwd=HERE,
+                                 capture_output=True, text=True, check=True)
+            runs.append(float(out.stdout.split()[-1]))
+        record(results, "load", name, None, (float(np.median(runs)), float(np.min(runs))), repeats)
+
+def bench_predict(results, engine, sizes, repeats, seed):
+    X, valid = encode_features(clean_columns(pd.read_csv(os.path.join(HERE, RAW_CSV))))
+    one = X[valid][:1]
+    record(results, "predict", "predict_proba 1 row", 1, measure(lambda: engine.predict_proba(one), repeats * 20), repeats * 20)
+    for n in sizes:
+        Xn, _ = encode_features(clean_columns(synth_registry(n, seed)))
+        record(results, "predict", "predict_proba batch", n, measure(lambda: engine.predict_proba(Xn), repeats), repeats)
+
+def bench_similar(results, registries, repeats):
+    query = symptom_mask(BINARY_COLS[::2])
+    for n, df in registries.items():
+        record(results, "similar", "index build", n, measure(lambda: SymptomIndex.from_frame(df), repeats), repeats)
+        index = SymptomIndex.from_frame(df)
+        record(results, "similar", "top_k(k=8, age)", n, measure(lambda: index.top_k(query, k=8, age=60), repeats), repeats)
+
+def bench_explorer(results, registries, repeats):
+    for n, df in registries.items():
+        record(results, "explorer", "compute_explorer_stats", n, measure(lambda: compute_explorer_stats(df), repeats), repeats)
+
+# ── macro ────────────────────────────────────────────────────────────────────
+def app_sandbox(tmp, df):
+    # link the app and its artifacts into tmp, with `df` as the survey CSV
+    for name in APP_FILES:
+        if os.path.exists(os.path.join(HERE, name)):
+            os.symlink(os.path.join(HERE, name), os.path.join(tmp, name))
+    if df is None:
+        os.symlink(os.path.join(HERE, RAW_CSV), os.path.join(tmp, RAW_CSV))
+    else:
+        names = pd.read_csv(os.path.join(HERE, RAW_CSV), nrows=0).columns
+        df.set_axis(names, axis=1).to_csv(os.path.join(tmp, RAW_CSV), index=False)
+    return os.path.join(tmp, "app.py")
+
+def bench_app(results, sizes, repeats, seed):
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            script = app_sandbox(tmp, None if n is None else synth_registry(n, seed))
+            label = n if n is not None else "survey"
+            cold, rerun, tabs, predict = [], [], [], []
+            for _ in range(repeats):
+                st.cache_data.clear(); st.cache_resource.clear()      # caches are process-wide: start cold
+                at = AppTest.from_file(script, default_timeout=600)
+                t0 = time.perf_counter(); at.run(); cold.append(time.perf_counter() - t0)
+                t0 = time.perf_counter(); at.run(); rerun.append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                for tab in TABS:
+                    at.session_state["main_tab"] = tab
+                    at.run()
+                tabs.append(time.perf_counter() - t0)
+                at.session_state["main_tab"] = "🔍 Predict Risk"     # Batch Screening is open after the walk
+                at.run()
+                btn = next(b for b in at.button if "Analyse" in b.label)
+                t0 = time.perf_counter(); btn.click(); at.run(); predict.append(time.perf_counter() - t0)
+                if at.exception:
+                    raise SystemExit(f"❌ app raised: {at.exception[0].value}")
+            for name, runs in (("cold run", cold), ("rerun", rerun), ("visit all tabs", tabs), ("predict click", predict)):
+                record(results, "app", name, label, (float(np.median(runs)), float(np.min(runs))), repeats)
+
+# ── baseline comparison ──────────────────────────────────────────────────────
+def _key(r):
+    return f"{r['group']}/{r['name']}@{r['size']}"
+
+def compare(results, baseline, tolerance):
+    base = {_key(r): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        b = base.get(_key(r))
+        if b is None:
+            continue
+        ratio = r["median_s"] / b["median_s"] if b["median_s"] > 0 else float("inf")
+        r["baseline_median_s"], r["ratio"] = b["median_s"], ratio
+        if ratio > 1 + tolerance:
+            regressions.append(r)
+            print(f"⚠️  regression {_key(r)}: {b['median_s']*1e3:.3f} → {r['median_s']*1e3:.3f} ms ({ratio:.2f}×)")
+    return regressions
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "machine": platform.machine(), "cpus": os.cpu_count(), "commit": commit,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Micro and macro benchmarks for the lung-cancer app")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000],
+                    help="synthetic registry sizes for predict/similar/explorer")
+    ap.add_argument("--app-sizes", type=int, nargs="*", default=[100_000],
+                    help="synthetic survey sizes for the app benchmark (the real survey always runs)")
+    ap.add_argument("--only", nargs="+", choices=["load", "predict", "similar", "explorer", "app"])
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", help="write results here")
+    ap.add_argument("--baseline", help="compare against this saved results file")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    ap.add_argument("--save-baseline", help="write results as the new baseline file")
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore")
+    only = set(args.only or ["load", "predict", "similar", "explorer", "app"])
+
+    results = []
+    engine, _ = load_bundle(os.path.join(HERE, BUNDLE_FILE))
+    if "load" in only:
+        bench_load(results, args.repeats)
+    if "predict" in only:
+        bench_predict(results, engine, args.sizes, args.repeats, args.seed)
+    if only & {"similar", "explorer"}:
+        registries = {n: synth_registry(n, args.seed) for n in args.sizes}
+        if "similar" in only:
+            bench_similar(results, registries, args.repeats)
+        if "explorer" in only:
+            bench_explorer(results, registries, args.repeats)
+        del registries
+    if "app" in only:
+        bench_app(results, [None] + args.app_sizes, max(1, args.repeats // 2), args.seed)
+
+    report = {"environment": environment(), "settings": vars(args), "results": results}
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        report["regressions"] = [_key(r) for r in regressions]
+        print(f"{'❌' if regressions else '✅'} {len(regressions)} regression(s) vs {args.baseline} "
+              f"(tolerance {args.tolerance:.0%})")
+    for path in filter(None, [args.json, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import pickle
+import struct
+import subprocess
+import sys
+import time
+import numpy as np
+from flat_ensemble import BaggedEnsemble, FlatEnsemble
+
+# ── Versioned single-file model bundle ───────────────────────────────────────
+# Replaces the five pickles with one file that loads without sklearn:
+#
+#   MAGIC (8 bytes) | format version (u32) | header length (u32) | JSON header
+#   | padding | array 0 | array 1 | ...          (every array 64-byte aligned)
+#
+# The header carries feature names, label encodings, the artifacts dict and
+# an index of the ensemble's flat node arrays (dtype/shape/offset), plus the
+# optional per-node training cover used for TreeSHAP — readers that do not
+# know an array simply skip it, so this stays format v1. Loading
+# memory-maps the file once and views the arrays in place, so several server
+# processes share the same physical pages.
+
+BUNDLE_FILE    = "lung_model.bundle"
+REPLICAS_FILE  = "lung_replicas.bundle"    # optional bagged replicas (train_model.py --replicas K)
+MAGIC          = b"LUNGBNDL"
+FORMAT_VERSION = 1
+ALIGN          = 64
+_PREFIX        = struct.Struct("<8sII")
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+def save_bundle(path, engine, artifacts, gender_classes, target_classes):
+    arrays = {k: np.ascontiguousarray(v) for k, v in engine.arrays().items()}
+    header = {
+        "format_version": FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model": {"kind": getattr(engine, "KIND", "flat_gbdt"), "init": engine.init, "depth": engine.depth,
+                  "n_trees": engine.n_trees, "fingerprint": engine.fingerprint()},
+        "feature_names": [str(f) for f in engine.feature_names],
+        "encodings": {"GENDER": list(gender_classes), "LUNG_CANCER": list(target_classes)},
+        "artifacts": artifacts,
+        "arrays": {},
+    }
+    # offsets depend on header size, which depends on the offsets — size the index first
+    for name, a in arrays.items():
+        header["arrays"][name] = {"dtype": a.dtype.str, "shape": list(a.shape), "offset": 0}
+    head_len = len(json.dumps(header).encode()) + 32 * len(arrays)
+    offset = _align(_PREFIX.size + head_len)
+    for name, a in arrays.items():
+        header["arrays"][name]["offset"] = offset
+        offset = _align(offset + a.nbytes)
+    head = json.dumps(header).encode().ljust(head_len)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(head)))
+        f.write(head)
+        for name, a in arrays.items():
+            f.seek(header["arrays"][name]["offset"])
+            f.write(a.tobytes())
+        f.truncate(offset)
+    os.replace(tmp, path)   # readers never see a half-written bundle
+
+def read_header(path):
+    with open(path, "rb") as f:
+        magic, version, head_len = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a model bundle")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"{path} has bundle format v{version}; this code reads up to v{FORMAT_VERSION}")
+        return json.loads(f.read(head_len))
+
+def load_bundle(path):
+    # → (FlatEnsemble over memory-mapped arrays, header dict)
+    header = read_header(path)
+    buf = np.memmap(path, dtype=np.uint8, mode="r")
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dt = np.dtype(spec["dtype"])
+        n = int(np.prod(spec["shape"])) * dt.itemsize
+        arrays[name] = buf[spec["offset"]:spec["offset"] + n].view(dt).reshape(spec["shape"])
+    m = header["model"]
+    cls = BaggedEnsemble if m["kind"] == BaggedEnsemble.KIND else FlatEnsemble
+    engine = cls.from_arrays(arrays, m["init"], m["depth"], header["feature_names"])
+    return engine, header
+
+def load_engine(path):
+    # bundle or legacy sklearn pickle, by extension
+    if path.endswith(".pkl"):
+        with open(path, "rb") as f: model = pickle.load(f)
+        return FlatEnsemble.from_model(model)
+    return load_bundle(path)[0]
+
+def build_from_pickles(out=BUNDLE_FILE, model_pkl="lung_xgb_model.pkl", le_gender_pkl="lung_le_gender.pkl",
+                       le_target_pkl="lung_le_target.pkl", artifacts_pkl="lung_artifacts.pkl"):
+    with open(model_pkl, "rb") as f: model = pickle.load(f)
+    with open(le_gender_pkl, "rb") as f: le_g = pickle.load(f)
+    with open(le_target_pkl, "rb") as f: le_t = pickle.load(f)
+    with open(artifacts_pkl, "rb") as f: arts = pickle.load(f)
+    engine = FlatEnsemble.from_model(model)
+    save_bundle(out, engine, arts, le_g.classes_.tolist(), le_t.classes_.tolist())
+    return engine
+
+
+# ── Cold-start measurement: fresh interpreter per path ───────────────────────
+_PROBE = r"""
+import resource, sys, time
+t0 = time.perf_counter()
+{load}
+t1 = time.perf_counter()
+X = [[1, 65] + [1] * 13]
+p = engine.predict(X)[1][0]
+t2 = time.perf_counter()
+kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(t1 - t0, t2 - t0, kb, int("sklearn" in sys.modules), p)
+"""
+
+_LOADS = {
+    "pickles": """
+import pickle
+from flat_ensemble import BaggedEnsemble, FlatEnsemble
+with open("lung_xgb_model.pkl","rb") as f: model = pickle.load(f)
+with open("lung_le_gender.pkl","rb") as f: le_g = pickle.load(f)
+with open("lung_le_target.pkl","rb") as f: le_t = pickle.load(f)
+with open("lung_artifacts.pkl","rb") as f: arts = pickle.load(f)
+with open("lung_feature_names.pkl","rb") as f: names = pickle.load(f)
+engine = FlatEnsemble.from_model(model)
+""",
+    "bundle": """
+from bundle import load_bundle
+engine, header = load_bundle("lung_model.bundle")
+""",
+}
+
+def measure(repeats=5):
+    here = os.path.dirname(os.path.abspath(__file__))
+    base = subprocess.run([sys.executable, "-c", "import resource,numpy;print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"],
+                          capture_output=True, text=True, check=True)
+    print(f"baseline interpreter + numpy: {int(base.stdout) / 1024:.1f} MB max RSS")
+    for name, load in _LOADS.items():
+        runs = []
+        for _ in range(repeats):
+            r = subprocess.run([sys.executable, "-W", "ignore", "-c", _PROBE.format(load=load)],
+                               capture_output=True, text=True, cwd=here, check=True)
+            runs.append([float(x) for x in r.stdout.split()])
+        load_s, first_s, kb, sk, p = np.median(np.array(runs), axis=0)
+        print(f"{name:>8}: load {load_s*1000:7.1f} ms · first prediction {first_s*1000:7.1f} ms · "
+              f"max RSS {kb/1024:6.1f} MB · sklearn imported: {'yes' if sk else 'no'} · p={p:.6f}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Build, inspect or benchmark the single-file model bundle")
+    ap.add_argument("command", choices=["build", "info", "measure"])
+    ap.add_argument("--out", default=BUNDLE_FILE)
+    args = ap.parse_args()
+
+    if args.command == "build":
+        engine = build_from_pickles(args.out)
+        print(f"✅ Wrote {args.out} ({os.path.getsize(args.out)/1024:.1f} KB, {engine.n_trees} trees)")
+    elif args.command == "info":
+        h = read_header(args.out)
+        print(json.dumps({k: v for k, v in h.items() if k != "artifacts"}, indent=2))
+    else:
+        measure()
@@ -0,0 +1,285 @@
+import argparse
+import os
+import time
+import warnings
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+from bundle import BUNDLE_FILE, load_engine, read_header, save_bundle
+from flat_ensemble import FlatEnsemble
+from risk_table import grid
+from survey import BINARY_COLS, FEATURE_NAMES, GENDER_CLASSES, TARGET_CLASSES, clean_columns, encode_features
+from synth_data import generate
+from train_model import evaluate, load_training_data, split
+
+# ── Accuracy-bounded ensemble compaction ─────────────────────────────────────
+# python compact_model.py --auc-tol 0.005 --proba-tol 0.05 --out lung_model_compact.bundle
+#
+#   1. simplify   drop splits an ancestor already decided (binary features are
+#                 0/1, so a second split on one is dead) and collapse sibling
+#                 subtrees of the same shape whose leaves differ by ≤ --leaf-tol
+#                 log-odds into one (cover-weighted); single-leaf trees fold
+#                 into init and trees with identical splits are summed
+#   2. prune      rank trees by how much their output varies over a reference
+#                 population; keep the k most varied, fold the rest's mean
+#                 into init
+#   3. refit      backfit the kept trees' leaf values so the compact model
+#                 matches the original's log-odds on that population, weighted
+#                 by (p(1−p))² — i.e. least squares on probabilities
+#
+# k is the smallest count (binary search) whose refitted model stays within
+# tolerance of the original: AUC drop ≤ --auc-tol on a validation split carved
+# out of the training split, and max |ΔP(YES)| ≤ --proba-tol on every input
+# the app can send (the full risk-table grid, ~1.1M rows). The test split is
+# not seen during selection, so its numbers in the report are held out. The
+# refit population is the rest of the training split, synth_data rows and a
+# uniform sample of the grid; its labels are never used, only the original
+# model's predictions. The saved artifacts are re-evaluated on the compact
+# model (train_model.evaluate), so the app's Performance tab describes it.
+# Works on any FlatEnsemble (bundle or pickle, every backend); tree cover is
+# kept, so TreeSHAP still works.
+
+REFIT_ROWS   = 100_000
+REFIT_SWEEPS = 3
+BENCH_ROWS   = 100_000
+_BINARY      = {FEATURE_NAMES.index(c) for c in ['GENDER'] + BINARY_COLS}
+
+# trees as nested tuples: leaf (value, cover) · split (feature, threshold, left, right, cover)
+def to_trees(engine):
+    def build(n):
+        if engine.left[n] == n:
+            return (float(engine.value[n]), float(engine.cover[n]))
+        return (int(engine.feature[n]), float(engine.threshold[n]),
+                build(engine.left[n]), build(engine.right[n]), float(engine.cover[n]))
+    return [build(int(r)) for r in engine.roots]
+
+def from_trees(trees, init, feature_names):
+    feature, threshold, left, right, value, cover, roots = [], [], [], [], [], [], []
+    def emit(node, depth):
+        i = len(feature)
+        feature.append(0); threshold.append(np.inf); left.append(i); right.append(i)
+        value.append(0.0); cover.append(node[-1])
+        if len(node) == 2:
+            value[i] = node[0]
+            return depth
+        feature[i], threshold[i] = node[0], node[1]
+        left[i] = len(feature); d = emit(node[2], depth + 1)
+        right[i] = len(feature); return max(d, emit(node[3], depth + 1))
+    depth = 1
+    for t in trees:
+        roots.append(len(feature))
+        depth = max(depth, emit(t, 0))
+    return FlatEnsemble(feature, threshold, left, right, value, roots, init, depth, feature_names, cover=cover)
+
+def _shape(node):
+    return None if len(node) == 2 else (node[0], node[1], _shape(node[2]), _shape(node[3]))
+
+def _leaf_values(node):
+    return [node[0]] if len(node) == 2 else _leaf_values(node[2]) + _leaf_values(node[3])
+
+def _combine(a, b, wa, wb):
+    # same-shaped trees → one tree with leaf values wa·a + wb·b, covers added
+    if len(a) == 2:
+        return (wa * a[0] + wb * b[0], a[1] + b[1])
+    return (a[0], a[1], _combine(a[2], b[2], wa, wb), _combine(a[3], b[3], wa, wb), a[4] + b[4])
+
+def simplify(node, leaf_tol=0.0, bounds=None):
+    bounds = bounds or {}
+    if len(node) == 2:
+        return node
+    f, t, l, r, c = node
+    lo, hi = bounds.get(f, (-np.inf, np.inf))          # x[f] ∈ (lo, hi] on this path
+    if f in _BINARY:
+        right = [v > t for v in (0.0, 1.0) if lo < v <= hi]
+        if all(right):
+            return simplify(r, leaf_tol, bounds)
+        if not any(right):
+            return simplify(l, leaf_tol, bounds)
+    elif t >= hi:
+        return simplify(l, leaf_tol, bounds)
+    elif t <= lo:
+        return simplify(r, leaf_tol, bounds)
+    l = simplify(l, leaf_tol, {**bounds, f: (lo, min(hi, t))})
+    r = simplify(r, leaf_tol, {**bounds, f: (max(lo, t), hi)})
+    if _shape(l) == _shape(r) and np.abs(np.subtract(_leaf_values(l), _leaf_values(r))).max() <= leaf_tol:
+        wl = l[-1] / (l[-1] + r[-1]) if l[-1] + r[-1] > 0 else 0.5
+        return _combine(l, r, wl, 1 - wl)
+    return (f, t, l, r, c)
+
+def merge_trees(trees, init):
+    # constant trees → init; trees with identical splits → one tree with summed leaves
+    groups = {}
+    for t in trees:
+        if len(t) == 2:
+            init += t[0]
+            continue
+        key = _shape(t)
+        groups[key] = _combine(groups[key], t, 1.0, 1.0) if key in groups else t
+    return list(groups.values()), init
+
+def refit(engine, X, target, weight, sweeps=REFIT_SWEEPS):
+    # backfitting: each tree's leaves ← weighted mean residual of the rows reaching them
+    nodes = engine.leaves(X)                            # (n, trees) leaf node ids
+    value = engine.value.copy()
+    contrib = value[nodes]
+    init = engine.init
+    resid = target - init - contrib.sum(axis=1)
+    for _ in range(sweeps):
+        for t in range(engine.n_trees):
+            ids = nodes[:, t]
+            r = resid + contrib[:, t]
+            den = np.bincount(ids, weight, minlength=len(value))
+            hit = den > 0
+            value[hit] = np.bincount(ids, weight * r, minlength=len(value))[hit] / den[hit]
+            contrib[:, t] = value[ids]
+            resid = r - contrib[:, t]
+        shift = np.average(resid, weights=weight)
+        init += shift
+        resid -= shift
+    return FlatEnsemble(engine.feature, engine.threshold, engine.left, engine.right, value, engine.roots,
+                        init, engine.depth, engine.feature_names, cover=engine.cover)
+
+def reference_rows(X_train, X_domain, n, seed):
+    # training rows + synthetic survey rows + a uniform sample of the input domain
+    synth, _ = encode_features(clean_columns(next(generate(n, seed=seed, chunksize=max(n, 1)))))
+    pick = np.random.default_rng(seed).choice(len(X_domain), size=min(n, len(X_domain)), replace=False)
+    return np.vstack([np.asarray(X_train, dtype=np.float32), synth, X_domain[pick]])
+
+def within(engine, X_val, y_val, auc_ref, X_domain, p_domain, auc_tol, proba_tol):
+    # → (ok, validation AUC, max |ΔP| over the domain); the domain pass is skipped once AUC fails
+    auc = roc_auc_score(y_val, engine.predict(X_val)[1])
+    if auc < auc_ref - auc_tol:
+        return False, auc, float("nan")
+    dp = float(np.abs(engine.predict(X_domain)[1] - p_domain).max())
+    return dp <= proba_tol, auc, dp
+
+def compact(engine, X_ref, X_val, y_val, X_domain, auc_tol=0.005, proba_tol=0.05, leaf_tol=1e-3, log=print):
+    auc_ref = roc_auc_score(y_val, engine.predict(X_val)[1])
+    p_domain = engine.predict(X_domain)[1]
+
+    trees, init = merge_trees([simplify(t, leaf_tol) for t in to_trees(engine)], engine.init)
+    simple = from_trees(trees, init, engine.feature_names)
+    log(f"simplify: {engine.n_trees} trees / {len(engine.feature)} nodes → "
+        f"{simple.n_trees} trees / {len(simple.feature)} nodes")
+
+    target = engine.raw(X_ref)
+    p = 1.0 / (1.0 + np.exp(-target))
+    weight = np.maximum((p * (1 - p)) ** 2, 1e-6)
+    contrib = simple.value[simple.leaves(X_ref)]         # (rows, trees)
+    spread = np.sqrt(np.average((contrib - contrib.mean(axis=0)) ** 2, axis=0, weights=weight))
+    order = np.argsort(-spread, kind="stable")
+    mean = np.average(contrib, axis=0, weights=weight)
+
+    def candidate(k):
+        keep = np.sort(order[:k])
+        folded = init + mean[order[k:]].sum()
+        return refit(from_trees([trees[i] for i in keep], folded, engine.feature_names), X_ref, target, weight)
+
+    best, lo, hi = engine, 1, simple.n_trees + 1        # hi = "no k passes": keep the original
+    while lo < hi:
+        k = (lo + hi) // 2
+        t0 = time.perf_counter()
+        cand = candidate(k)
+        ok, auc, dp = within(cand, X_val, y_val, auc_ref, X_domain, p_domain, auc_tol, proba_tol)
+        log(f"  {k:4d} trees: validation AUC {auc:.4f} (ref {auc_ref:.4f}) · domain max |ΔP| {dp:.4f} · "
+            f"{'ok' if ok else 'out of tolerance'} ({time.perf_counter() - t0:.1f}s)")
+        if ok:
+            best, hi = cand, k
+        else:
+            lo = k + 1
+    return best
+
+class _Fitted(ClassifierMixin, BaseEstimator):
+    # sklearn view of a FlatEnsemble, so train_model.evaluate() can score it
+    def __init__(self, engine=None):
+        self.engine = engine
+        self.classes_ = np.array([0, 1])
+
+    def __sklearn_is_fitted__(self):
+        return True
+
+    def fit(self, X, y):
+        return self
+
+    def predict(self, X):
+        return self.engine.predict(np.asarray(X, dtype=np.float32))[0]
+
+    def predict_proba(self, X):
+        return self.engine.predict_proba(np.asarray(X, dtype=np.float32))
+
+def throughput(engine, X, repeats=5):
+    best = np.inf
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        engine.predict(X)
+        best = min(best, time.perf_counter() - t0)
+    return len(X) / best
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Prune, merge and refit the boosted ensemble within an accuracy tolerance")
+    ap.add_argument("--model", default=BUNDLE_FILE, help="bundle or sklearn pickle to compact")
+    ap.add_argument("--out", default="lung_model_compact.bundle",
+                    help=f"compact bundle to write (use {BUNDLE_FILE} to deploy; the app hot-reloads it)")
+    ap.add_argument("--auc-tol", type=float, default=0.005, help="allowed drop in validation AUC")
+    ap.add_argument("--proba-tol", type=float, default=0.05, help="allowed max |ΔP(YES)| on any input in the domain grid")
+    ap.add_argument("--leaf-tol", type=float, default=1e-3, help="log-odds difference under which sibling subtrees merge")
+    ap.add_argument("--ref-rows", type=int, default=REFIT_ROWS, help="synthetic rows the refit matches the model on")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore")
+
+    engine = load_engine(args.model)
+    if engine.cover is None:
+        raise SystemExit(f"❌ {args.model} has no node cover; rebuild it from the fitted model")
+    X, y, _, _, _ = load_training_data()
+    X_train, X_test_df, y_train, y_test = split(X, y)
+    # k is chosen on a validation split of the training data; the test split is only reported
+    X_fit, X_val, _, y_val = train_test_split(X_train, y_train, test_size=0.25, random_state=args.seed, stratify=y_train)
+    X_test, y_test = X_test_df.to_numpy(np.float32), y_test.to_numpy()
+    X_val, y_val = X_val.to_numpy(np.float32), y_val.to_numpy()
+    X_domain = grid(21, 87)
+    X_ref = reference_rows(X_fit, X_domain, args.ref_rows, args.seed)
+
+    t0 = time.perf_counter()
+    small = compact(engine, X_ref, X_val, y_val, X_domain, args.auc_tol, args.proba_tol, args.leaf_tol)
+    elapsed = time.perf_counter() - t0
+
+    p_ref, p_new = engine.predict(X_test)[1], small.predict(X_test)[1]
+    (l_dom0, p_dom0), (l_dom1, p_dom1) = engine.predict(X_domain), small.predict(X_domain)
+    bench, _ = encode_features(clean_columns(next(generate(BENCH_ROWS, seed=args.seed + 1, chunksize=BENCH_ROWS))))
+    dp_pop = np.abs(small.predict(bench)[1] - engine.predict(bench)[1])
+    report = {
+        "source": os.path.basename(args.model), "source_fingerprint": engine.fingerprint(),
+        "auc_tol": args.auc_tol, "proba_tol": args.proba_tol, "leaf_tol": args.leaf_tol, "seconds": elapsed,
+        "trees": [engine.n_trees, small.n_trees], "nodes": [len(engine.feature), len(small.feature)],
+        "heldout_auc": [float(roc_auc_score(y_test, p_ref)), float(roc_auc_score(y_test, p_new))],
+        "heldout_max_dp": float(np.abs(p_new - p_ref).max()),
+        "domain_max_dp": float(np.abs(p_dom1 - p_dom0).max()), "domain_label_flips": int((l_dom0 != l_dom1).sum()),
+        "population_mean_dp": float(dp_pop.mean()), "population_p99_dp": float(np.percentile(dp_pop, 99)),
+        "rows_per_s": [throughput(engine, bench), throughput(small, bench)],
+    }
+    header = read_header(args.model) if not args.model.endswith(".pkl") else None
+    arts = dict(header["artifacts"]) if header else {}
+    # test-split metrics, curves, importances and bootstrap CIs of the model actually saved;
+    # training-procedure entries (cv_scores, model_comparison, drift_reference) stay as trained
+    arts.update(evaluate(_Fitted(small), X_test_df, y_test))
+    arts["compaction"] = report
+    enc = header["encodings"] if header else {"GENDER": GENDER_CLASSES, "LUNG_CANCER": TARGET_CLASSES}
+    save_bundle(args.out, small, arts, enc["GENDER"], enc["LUNG_CANCER"])
+
+    size = [os.path.getsize(args.model), os.path.getsize(args.out)]
+    (t0_, t1_), (n0, n1), (a0, a1), (r0, r1) = report["trees"], report["nodes"], report["heldout_auc"], report["rows_per_s"]
+    print(f"✅ Wrote {args.out} in {elapsed:.1f}s")
+    print(f"   trees       {t0_:>10,} → {t1_:>10,}   ({t1_ / t0_:.0%})")
+    print(f"   nodes       {n0:>10,} → {n1:>10,}   ({n1 / n0:.0%})")
+    print(f"   size        {size[0]/1024:>8.1f}KB → {size[1]/1024:>8.1f}KB   ({os.path.basename(args.model)} → {os.path.basename(args.out)})")
+    print(f"   throughput  {r0:>10,.0f} → {r1:>10,.0f}   rows/s on {BENCH_ROWS:,} rows ({r1 / r0:.2f}×)")
+    print(f"   held-out    AUC {a0:.4f} → {a1:.4f} · max |ΔP| {report['heldout_max_dp']:.4f}")
+    print(f"   population  mean |ΔP| {report['population_mean_dp']:.4f} · p99 {report['population_p99_dp']:.4f}")
+    print(f"   domain      max |ΔP| {report['domain_max_dp']:.4f} · {report['domain_label_flips']:,} label flips "
+          f"over {len(X_domain):,} inputs")
+    if args.out == BUNDLE_FILE:
+        print("   the risk table is tied to the old fingerprint — rebuild it with `python risk_table.py` "
+              "(verified against the new bundle)")
@@ -0,0 +1,193 @@
+import bisect
+import threading
+import time
+import numpy as np
+import metrics
+from survey import BINARY_COLS
+
+# ── Streaming input-drift monitor ────────────────────────────────────────────
+# Every scored input is folded into one fixed-size sketch:
+#   · a joint histogram over (GENDER, 13-symptom bitmask) — 2 × 8192 counts
+#   · an age histogram over AGE_EDGES
+# Both are exact counts in constant memory (~130 KB however many rows are
+# seen). Per-feature rates and every pairwise symptom co-occurrence are
+# marginals of the joint histogram, so they are derived when a report is
+# asked for, not maintained per row: one observation is a mask, a bisect
+# and two increments under a lock (a few µs).
+#
+# The training-time reference is the same sketch over the training split,
+# stored sparsely in the artifacts ("drift_reference"). Live vs reference
+# is scored per feature / age / symptom pair with PSI and KL(live ‖ ref).
+#
+# The live comparison is also exported as lung_drift_* gauges through a metrics
+# collector, so it runs once per (throttled) Prometheus export, admin page or not.
+#
+# python drift.py     → per-observation overhead and a sample report
+
+AGE_EDGES   = [25, 30, 35, 40, 45, 50, 55, 60, 65, 70, 75, 80, 85]   # bins (-inf,25) [25,30) … [85,inf)
+N_MASKS     = 1 << len(BINARY_COLS)
+PSEUDOCOUNT = 0.5            # per cell, so empty bins keep PSI/KL finite
+PSI_WARN, PSI_ALERT = 0.1, 0.25
+_BITS = (np.arange(N_MASKS)[:, None] >> np.arange(len(BINARY_COLS))) & 1     # (8192, 13)
+_WEIGHTS = 1 << np.arange(len(BINARY_COLS))
+
+class DriftSketch:
+    def __init__(self, age_edges=AGE_EDGES):
+        self.age_edges = list(age_edges)
+        self.joint = np.zeros(2 * N_MASKS, dtype=np.int64)      # index = gender · 8192 + symptom mask
+        self.age = np.zeros(len(self.age_edges) + 1, dtype=np.int64)
+        self.n = 0
+        self.since = time.time()
+        self._lock = threading.Lock()
+
+    def observe(self, row):
+        # one encoded row [gender, age, 13 × 0/1] — the per-prediction path
+        mask = 0
+        for j, v in enumerate(row[2:]):
+            if v:
+                mask |= 1 << j
+        idx = (N_MASKS if row[0] else 0) + mask
+        b = bisect.bisect_right(self.age_edges, row[1])
+        with self._lock:
+            self.joint[idx] += 1
+            self.age[b] += 1
+            self.n += 1
+
+    def update(self, X):
+        # (n, 15) encoded rows in one vectorized step — batch scoring / reference building
+        X = np.asarray(X)
+        if not len(X):
+            return self
+        idx = (X[:, 0] > 0.5) * N_MASKS + (X[:, 2:] > 0.5) @ _WEIGHTS
+        joint = np.bincount(idx.astype(np.intp), minlength=2 * N_MASKS)
+        age = np.bincount(np.searchsorted(self.age_edges, X[:, 1], side="right"), minlength=len(self.age))
+        with self._lock:
+            self.joint += joint
+            self.age += age
+            self.n += len(X)
+        return self
+
+    def reset(self):
+        with self._lock:
+            self.joint[:] = 0
+            self.age[:] = 0
+            self.n = 0
+            self.since = time.time()
+
+    def to_dict(self):
+        # sparse, JSON-safe: only the (gender, mask) cells that were seen
+        nz = np.flatnonzero(self.joint)
+        return {"n": int(self.n), "age_edges": self.age_edges, "age": self.age.tolist(),
+                "joint": {str(int(i)): int(self.joint[i]) for i in nz}}
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls(d["age_edges"])
+        for i, c in d["joint"].items():
+            s.joint[int(i)] = c
+        s.age[:] = d["age"]
+        s.n = d["n"]
+        return s
+
+    def marginals(self):
+        # → (gender counts [F, M], per-symptom present counts (13,), pair counts n11 (13, 13), age counts)
+        with self._lock:
+            joint, age = self.joint.reshape(2, N_MASKS).copy(), self.age.copy()
+        by_mask = joint.sum(axis=0)
+        pair = _BITS.T @ (_BITS * by_mask[:, None])
+        return joint.sum(axis=1), np.diag(pair).copy(), pair, age
+
+def _psi_kl(live, ref):
+    # PSI and KL(live ‖ ref) between two count vectors, smoothed
+    p = (np.asarray(live, dtype=np.float64) + PSEUDOCOUNT)
+    q = (np.asarray(ref, dtype=np.float64) + PSEUDOCOUNT)
+    p, q = p / p.sum(), q / q.sum()
+    log = np.log(p / q)
+    return float(((p - q) * log).sum()), float((p * log).sum())
+
+def _pair_cells(n, present, n11, i, j):
+    # 2×2 table of symptoms i, j: [neither, i only, j only, both]
+    both = n11[i, j]
+    return [n - present[i] - present[j] + both, present[i] - both, present[j] - both, both]
+
+def status(psi):
+    return "alert" if psi >= PSI_ALERT else "warn" if psi >= PSI_WARN else "ok"
+
+def compare(live, ref):
+    # → {"n", "features": [...], "age": {...}, "pairs": [...]} — live vs reference sketch
+    if live.age_edges != ref.age_edges:
+        raise ValueError("live and reference sketches use different age bins")
+    lg, ls, lp, la = live.marginals()
+    rg, rs, rp, ra = ref.marginals()
+    features = []
+    psi, kl = _psi_kl(lg, rg)
+    features.append({"feature": "GENDER", "ref_rate": rg[1] / max(ref.n, 1), "live_rate": lg[1] / max(live.n, 1),
+                     "psi": psi, "kl": kl})
+    for j, c in enumerate(BINARY_COLS):
+        psi, kl = _psi_kl([live.n - ls[j], ls[j]], [ref.n - rs[j], rs[j]])
+        features.append({"feature": c, "ref_rate": rs[j] / max(ref.n, 1), "live_rate": ls[j] / max(live.n, 1),
+                         "psi": psi, "kl": kl})
+    psi, kl = _psi_kl(la, ra)
+    age = {"edges": live.age_edges, "live": la.tolist(), "ref": ra.tolist(), "psi": psi, "kl": kl}
+    pairs = []
+    for i in range(len(BINARY_COLS)):
+        for j in range(i + 1, len(BINARY_COLS)):
+            psi, kl = _psi_kl(_pair_cells(live.n, ls, lp, i, j), _pair_cells(ref.n, rs, rp, i, j))
+            pairs.append({"pair": (BINARY_COLS[i], BINARY_COLS[j]), "ref_rate": rp[i, j] / max(ref.n, 1),
+                          "live_rate": lp[i, j] / max(live.n, 1), "psi": psi, "kl": kl})
+    pairs.sort(key=lambda r: -r["psi"])
+    return {"n": live.n, "ref_n": ref.n, "since": live.since, "features": features, "age": age, "pairs": pairs}
+
+def reference(X):
+    # training-time reference for the artifacts
+    return DriftSketch().update(X).to_dict()
+
+MONITOR = DriftSketch()      # process-wide: every session and batch job folds into it
+_reference = (None, None)    # (artifact dict, sketch) of the model currently serving
+
+def set_reference(d):
+    # the serving model's artifacts["drift_reference"] (None for older artifacts); cheap when unchanged
+    global _reference
+    if d is not _reference[0]:
+        _reference = (d, DriftSketch.from_dict(d) if d else None)
+
+def report():
+    # MONITOR vs the current reference, or None without one
+    ref = _reference[1]
+    return compare(MONITOR, ref) if ref is not None else None
+
+@metrics.REGISTRY.collect
+def export_gauges():
+    rep = report()
+    if rep is None:
+        return
+    for r in rep["features"]:
+        metrics.gauge("lung_drift_psi", r["psi"], feature=r["feature"])
+    metrics.gauge("lung_drift_psi", rep["age"]["psi"], feature="AGE")
+    metrics.gauge("lung_drift_pair_psi_max", rep["pairs"][0]["psi"])
+    metrics.gauge("lung_drift_observations", rep["n"])
+
+
+if __name__ == "__main__":
+    import pandas as pd
+    from survey import RAW_CSV, clean_columns, encode_features
+    from synth_data import generate
+
+    X, valid = encode_features(clean_columns(pd.read_csv(RAW_CSV)))
+    ref = DriftSketch().update(X[valid])
+    sketch = DriftSketch()
+    rows = [list(map(float, r)) for r in X[valid]]
+    n = 200_000
+    t0 = time.perf_counter()
+    for i in range(n):
+        sketch.observe(rows[i % len(rows)])
+    print(f"observe overhead: {(time.perf_counter() - t0) / n * 1e6:.2f} µs per row ({n:,} rows)")
+    synth, _ = encode_features(clean_columns(next(generate(1_000_000, seed=0, chunksize=1_000_000))))
+    t0 = time.perf_counter()
+    sketch.update(synth)
+    print(f"update: {(time.perf_counter() - t0) * 1e3:.1f} ms for {len(synth):,} rows")
+    old = synth[synth[:, 1] >= 60]
+    t0 = time.perf_counter()
+    rep = compare(DriftSketch().update(old), ref)
+    print(f"report: {(time.perf_counter() - t0) * 1e3:.1f} ms · age PSI {rep['age']['psi']:.3f} ({status(rep['age']['psi'])}) "
+          f"for a 60+ only stream · top pair {rep['pairs'][0]['pair']} PSI {rep['pairs'][0]['psi']:.3f}")
@@ -0,0 +1,55 @@
+import hashlib
+import os
+import numpy as np
+from survey import BINARY_COLS, TARGET
+
+# ── Data Explorer aggregates in one vectorized pass ──────────────────────────
+# Everything the Data Explorer tab shows is derived from a handful of matrix
+# products over the survey, so it is computed once per dataset version and
+# the tab only renders stored numbers. Dataset versions are identified by a
+# content hash of the source file (memoised on mtime/size so a rerun does not
+# re-read the file).
+
+_digest_memo = {}
+
+def file_digest(path, block=1 << 20):
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    if key not in _digest_memo:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(block), b""):
+                h.update(chunk)
+        _digest_memo[key] = h.hexdigest()
+    return _digest_memo[key]
+
+def compute_explorer_stats(df):
+    n = len(df)
+    target = (df[TARGET] == 'YES').to_numpy()
+    present = df[BINARY_COLS].to_numpy() == 2                               # (n, 13)
+    n_yes = int(target.sum())
+    n_no = n - n_yes
+    groups = np.column_stack([target, ~target]).astype(np.float64)         # (n, 2)
+    counts = groups.T @ present                                            # (2, 13) symptom counts per class
+    yes_rate = counts[0] / max(n_yes, 1) * 100
+    no_rate = counts[1] / max(n_no, 1) * 100
+
+    # Pearson r of every feature with the target in one centred matrix product
+    age = df['AGE'].to_numpy(dtype=np.float64)
+    feats = np.column_stack([age, (df['GENDER'] == 'M').to_numpy(), present]).astype(np.float64)
+    fc = feats - feats.mean(axis=0)
+    tc = target - target.mean()
+    denom = np.sqrt((fc ** 2).sum(axis=0) * (tc ** 2).sum())
+    corr = np.divide(fc.T @ tc, denom, out=np.full(feats.shape[1], np.nan), where=denom > 0)
+
+    gender_counts = df['GENDER'].value_counts()
+    return {
+        "n_rows": n,
+        "n_yes": n_yes,
+        "n_no": n_no,
+        "age": {"min": float(age.min()), "mean": float(age.mean()),
+                "50%": float(np.median(age)), "max": float(age.max())},
+        "gender_counts": {str(g): int(c) for g, c in gender_counts.items()},
+        "prevalence": {c: (float(y), float(o)) for c, y, o in zip(BINARY_COLS, yes_rate, no_rate)},
+        "correlation": dict(zip(['AGE', 'GENDER'] + BINARY_COLS, corr.tolist())),
+    }
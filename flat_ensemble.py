@@ -0,0 +1,280 @@
+import hashlib
+import json
+import numpy as np
+
+# ── Flattened gradient-boosted ensemble ──────────────────────────────────────
+# All trees live in one set of contiguous node arrays. Leaves point to
+# themselves, so a batch is pushed down every tree at once with a fixed
+# number of vectorized gather steps (= max tree depth): no per-call
+# validation and no DataFrame round-trip.
+#
+# Distinct (feature, threshold) split conditions are shared by many nodes
+# (13 binary symptoms all split at 0.5), so each chunk evaluates every
+# condition once into a bit matrix and traversal only gathers those bits.
+#
+# `cover` (training samples reaching each node) is optional: scoring never
+# reads it, it only feeds path-dependent TreeSHAP (treeshap.py).
+
+CHUNK_ROWS = 2048
+
+class FlatEnsemble:
+    ARRAYS = ("feature", "threshold", "left", "right", "value", "roots")
+
+    def __init__(self, feature, threshold, left, right, value, roots, init, depth, feature_names=None,
+                 cover=None):
+        self.feature   = np.ascontiguousarray(feature, dtype=np.int32)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left      = np.ascontiguousarray(left, dtype=np.int32)
+        self.right     = np.ascontiguousarray(right, dtype=np.int32)
+        self.value     = np.ascontiguousarray(value, dtype=np.float64)   # already scaled by learning rate
+        self.roots     = np.ascontiguousarray(roots, dtype=np.int32)
+        self.init      = float(init)
+        self.depth     = int(depth)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.cover     = np.ascontiguousarray(cover, dtype=np.float64) if cover is not None else None
+
+        conds, node_cond = np.unique(np.column_stack([self.feature, self.threshold]),
+                                     axis=0, return_inverse=True)
+        self._cond_feature   = conds[:, 0].astype(np.intp)
+        self._cond_threshold = conds[:, 1]
+        self._node_cond      = node_cond.ravel().astype(np.int32)
+        self._child          = np.column_stack([self.left, self.right]).ravel()
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def fingerprint(self):
+        # content hash of the scoring arrays — identifies a model independent of how it was stored
+        h = hashlib.sha256()
+        for name in self.ARRAYS:
+            h.update(np.ascontiguousarray(getattr(self, name)).tobytes())
+        h.update(np.float64(self.init).tobytes())
+        return h.hexdigest()
+
+    def arrays(self):
+        out = {name: getattr(self, name) for name in self.ARRAYS}
+        if self.cover is not None:
+            out["cover"] = self.cover
+        return out
+
+    @classmethod
+    def from_arrays(cls, arrays, init, depth, feature_names=None):
+        return cls(*(arrays[name] for name in cls.ARRAYS), init, depth, feature_names,
+                   cover=arrays.get("cover"))
+
+    @classmethod
+    def from_sklearn(cls, model):
+        # GradientBoostingClassifier (binary): raw = init + lr * Σ tree(x)
+        feature, threshold, left, right, value, roots, cover = [], [], [], [], [], [], []
+        offset, depth = 0, 0
+        for est in model.estimators_[:, 0]:
+            t = est.tree_
+            n = t.node_count
+            is_leaf = t.children_left == -1
+            idx = np.arange(n) + offset
+            feature.append(np.where(is_leaf, 0, t.feature))
+            threshold.append(np.where(is_leaf, np.inf, t.threshold))
+            left.append(np.where(is_leaf, idx, t.children_left + offset))
+            right.append(np.where(is_leaf, idx, t.children_right + offset))
+            value.append(t.value[:, 0, 0] * model.learning_rate)
+            cover.append(t.weighted_n_node_samples)
+            roots.append(offset)
+            depth = max(depth, t.max_depth)
+            offset += n
+        init = model._raw_predict_init(np.zeros((1, model.n_features_in_)))[0, 0]
+        names = getattr(model, "feature_names_in_", None)
+        return cls(np.concatenate(feature), np.concatenate(threshold),
+                   np.concatenate(left), np.concatenate(right),
+                   np.concatenate(value), np.array(roots), init, depth, names,
+                   cover=np.concatenate(cover))
+
+    @classmethod
+    def from_hist_gradient_boosting(cls, model):
+        # HistGradientBoostingClassifier (binary): leaf values already include shrinkage.
+        # Missing-value routing is not modelled — survey inputs are always complete.
+        feature, threshold, left, right, value, roots, cover = [], [], [], [], [], [], []
+        offset, depth = 0, 0
+        for (pred,) in model._predictors:
+            nodes = pred.nodes
+            n = len(nodes)
+            is_leaf = nodes["is_leaf"].astype(bool)
+            idx = np.arange(n) + offset
+            feature.append(np.where(is_leaf, 0, nodes["feature_idx"]))
+            threshold.append(np.where(is_leaf, np.inf, nodes["num_threshold"]))
+            left.append(np.where(is_leaf, idx, nodes["left"].astype(np.int64) + offset))
+            right.append(np.where(is_leaf, idx, nodes["right"].astype(np.int64) + offset))
+            value.append(np.where(is_leaf, nodes["value"], 0.0))
+            cover.append(nodes["count"])
+            roots.append(offset)
+            depth = max(depth, int(nodes["depth"].max()))
+            offset += n
+        init = float(np.ravel(model._baseline_prediction)[0])
+        names = getattr(model, "feature_names_in_", None)
+        return cls(np.concatenate(feature), np.concatenate(threshold),
+                   np.concatenate(left), np.concatenate(right),
+                   np.concatenate(value), np.array(roots), init, depth, names,
+                   cover=np.concatenate(cover))
+
+    @classmethod
+    def from_xgboost(cls, model):
+        # XGBClassifier (binary:logistic). xgboost sends x < split left; on float32
+        # inputs that equals x <= the next float32 below the split.
+        booster = model.get_booster()
+        names = booster.feature_names or [f"f{i}" for i in range(booster.num_features())]
+        col = {name: i for i, name in enumerate(names)}
+        feature, threshold, left, right, value, roots, cover = [], [], [], [], [], [], []
+        offset, depth = 0, 0
+        for dump in booster.get_dump(dump_format="json", with_stats=True):
+            flat = {}
+            stack = [(json.loads(dump), 0)]
+            while stack:
+                node, d = stack.pop()
+                flat[node["nodeid"]] = (node, d)
+                for child in node.get("children", []):
+                    stack.append((child, d + 1))
+            order = sorted(flat)               # nodeid → position within this tree
+            pos = {nid: i + offset for i, nid in enumerate(order)}
+            for nid in order:
+                node, d = flat[nid]
+                if "leaf" in node:
+                    feature.append(0); threshold.append(np.inf)
+                    left.append(pos[nid]); right.append(pos[nid]); value.append(node["leaf"])
+                else:
+                    split = np.float32(node["split_condition"])
+                    feature.append(col[node["split"]])
+                    threshold.append(float(np.nextafter(split, np.float32(-np.inf))))
+                    left.append(pos[node["yes"]]); right.append(pos[node["no"]]); value.append(0.0)
+                cover.append(node["cover"])
+                depth = max(depth, d)
+            roots.append(pos[0])
+            offset += len(order)
+        cfg = json.loads(booster.save_config())["learner"]["learner_model_param"]
+        base = float(str(cfg["base_score"]).strip("[]"))
+        init = float(np.log(base / (1 - base)))
+        return cls(feature, threshold, left, right, value, np.array(roots), init, depth, names,
+                   cover=cover)
+
+    @classmethod
+    def from_model(cls, model):
+        kind = type(model).__name__
+        if kind == "GradientBoostingClassifier":
+            return cls.from_sklearn(model)
+        if kind == "HistGradientBoostingClassifier":
+            return cls.from_hist_gradient_boosting(model)
+        if kind == "XGBClassifier":
+            return cls.from_xgboost(model)
+        raise TypeError(f"Cannot flatten a {kind}")
+
+    def _leaves_chunk(self, X):
+        n = X.shape[0]
+        # sklearn compares float32 inputs against float64 thresholds; True = go right
+        go_right = (X[:, self._cond_feature] > self._cond_threshold).T.ravel().view(np.uint8)
+        base = np.arange(n, dtype=np.int32)[:, None]
+        node = np.broadcast_to(self.roots, (n, self.n_trees))
+        for _ in range(self.depth):
+            node = self._child[2 * node + go_right[self._node_cond[node] * n + base]]
+        return node
+
+    def leaves(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[0] <= CHUNK_ROWS:
+            return self._leaves_chunk(X)
+        return np.concatenate([self._leaves_chunk(X[s:s + CHUNK_ROWS])
+                               for s in range(0, X.shape[0], CHUNK_ROWS)])
+
+    def raw(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        out = np.empty(X.shape[0])
+        for s in range(0, X.shape[0], CHUNK_ROWS):
+            out[s:s + CHUNK_ROWS] = self.value[self._leaves_chunk(X[s:s + CHUNK_ROWS])].sum(axis=1)
+        return out + self.init
+
+    def predict(self, X):
+        # one pass → (labels, P(class 1)); label follows sklearn's argmax tie rule
+        raw = self.raw(X)
+        proba = 1.0 / (1.0 + np.exp(-raw))
+        return (raw > 0).astype(np.int8), proba
+
+    def predict_proba(self, X):
+        _, p1 = self.predict(X)
+        return np.column_stack([1.0 - p1, p1])
+
+
+# ── Bagged replicas, scored in one fused traversal ───────────────────────────
+# K boosting models fitted on bootstrap resamples are concatenated into one
+# FlatEnsemble (init 0). A single leaves() pass covers all K × n_trees trees;
+# per-replica sums come from one reduceat over the contiguous tree blocks.
+
+class BaggedEnsemble:
+    KIND = "bagged_gbdt"
+
+    def __init__(self, fused, starts, inits):
+        self.fused  = fused
+        self.starts = np.ascontiguousarray(starts, dtype=np.intp)
+        self.inits  = np.ascontiguousarray(inits, dtype=np.float64)
+        self.init, self.depth, self.feature_names = 0.0, fused.depth, fused.feature_names
+
+    @property
+    def k(self):
+        return len(self.starts)
+
+    @property
+    def n_trees(self):
+        return self.fused.n_trees
+
+    def fingerprint(self):
+        h = hashlib.sha256(self.fused.fingerprint().encode())
+        h.update(self.starts.astype(np.int64).tobytes())
+        h.update(self.inits.tobytes())
+        return h.hexdigest()
+
+    def arrays(self):
+        out = {name: getattr(self.fused, name) for name in FlatEnsemble.ARRAYS}
+        out["replica_starts"] = self.starts.astype(np.int64)
+        out["replica_inits"] = self.inits
+        return out
+
+    @classmethod
+    def from_arrays(cls, arrays, init, depth, feature_names=None):
+        fused = FlatEnsemble(*(arrays[name] for name in FlatEnsemble.ARRAYS), 0.0, depth, feature_names)
+        return cls(fused, arrays["replica_starts"], arrays["replica_inits"])
+
+    @classmethod
+    def from_models(cls, models):
+        parts = [FlatEnsemble.from_model(m) for m in models]
+        node_off = np.cumsum([0] + [len(e.feature) for e in parts[:-1]])
+        tree_off = np.cumsum([0] + [e.n_trees for e in parts[:-1]])
+        fused = FlatEnsemble(np.concatenate([e.feature for e in parts]),
+                             np.concatenate([e.threshold for e in parts]),
+                             np.concatenate([e.left + o for e, o in zip(parts, node_off)]),
+                             np.concatenate([e.right + o for e, o in zip(parts, node_off)]),
+                             np.concatenate([e.value for e in parts]),
+                             np.concatenate([e.roots + o for e, o in zip(parts, node_off)]),
+                             0.0, max(e.depth for e in parts), parts[0].feature_names)
+        return cls(fused, tree_off, [e.init for e in parts])
+
+    def raw(self, X):
+        # → (n, k) raw scores, one column per replica
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        out = np.empty((X.shape[0], self.k))
+        rows = max(64, CHUNK_ROWS // self.k)        # keep the (rows × trees) working set cache-sized
+        for s in range(0, X.shape[0], rows):
+            leaf_values = self.fused.value[self.fused._leaves_chunk(X[s:s + rows])]
+            out[s:s + rows] = np.add.reduceat(leaf_values, self.starts, axis=1)
+        return out + self.inits
+
+    def predict_replicas(self, X):
+        return 1.0 / (1.0 + np.exp(-self.raw(X)))
+
+    def predict_interval(self, X, ci=0.9):
+        # → (mean P(YES), lower, upper) across replicas
+        p = self.predict_replicas(X)
+        lo, hi = np.percentile(p, [50 * (1 - ci), 50 * (1 + ci)], axis=1)
+        return p.mean(axis=1), lo, hi
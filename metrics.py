@@ -0,0 +1,185 @@
+import bisect
+import functools
+import os
+import resource
+import threading
+import time
+import traceback
+
+# ── Always-on latency histograms, counters and gauges ────────────────────────
+# One observation = a perf_counter pair, a bisect into fixed buckets and a
+# lock (a few µs), so stages can stay instrumented in production. The registry
+# is module state: it lives as long as the server process and aggregates over
+# every Streamlit session and rerun. Exported in Prometheus text format.
+#
+# python metrics.py        → measures the per-observation overhead
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_FILE = os.environ.get("LUNG_METRICS_FILE", "lung_metrics.prom")   # app.py writes it next to itself unless absolute
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)     # last slot = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # upper bound of the bucket holding the q-th observation (what histogram_quantile would bracket)
+        if not self.count:
+            return float("nan")
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+class _Timer:
+    __slots__ = ("registry", "key", "t0")
+
+    def __init__(self, registry, key):
+        self.registry, self.key = registry, key
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry._observe(self.key, time.perf_counter() - self.t0)
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms, self.counters, self.gauges = {}, {}, {}
+        self.collectors = []                        # callables that refresh gauges right before an export
+        self._last_write = 0.0
+
+    def observe(self, name, value, **labels):
+        self._observe(_key(name, labels), value)
+
+    def _observe(self, key, value):
+        with self._lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = Histogram()
+            h.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def time(self, name, **labels):
+        return _Timer(self, _key(name, labels))
+
+    def timed(self, name, **labels):
+        key = _key(name, labels)
+        def wrap(fn):
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                with _Timer(self, key):
+                    return fn(*args, **kwargs)
+            return inner
+        return wrap
+
+    def sample_process(self):
+        # current RSS from /proc where available, plus peak RSS and CPU time from getrusage
+        ru = resource.getrusage(resource.RUSAGE_SELF)
+        try:
+            with open("/proc/self/statm") as f:
+                self.set("process_resident_memory_bytes", int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"))
+        except (OSError, ValueError):
+            pass
+        self.set("process_max_resident_memory_bytes", ru.ru_maxrss * (1 if os.uname().sysname == "Darwin" else 1024))
+        with self._lock:
+            self.counters[_key("process_cpu_seconds_total", {})] = ru.ru_utime + ru.ru_stime
+
+    def collect(self, fn):
+        # register fn() to run at every export (e.g. derived gauges too costly to keep per request)
+        if fn not in self.collectors:
+            self.collectors.append(fn)
+        return fn
+
+    def prometheus(self):
+        self.sample_process()
+        for fn in list(self.collectors):
+            try:
+                fn()
+            except Exception:                       # a broken collector must not block the export
+                traceback.print_exc()
+        with self._lock:
+            hists = {k: (list(h.counts), h.sum, h.count, h.buckets) for k, h in self.histograms.items()}
+            counters, gauges = dict(self.counters), dict(self.gauges)
+        lines, typed = [], set()
+        def head(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+        for (name, labels), (counts, total, n, buckets) in sorted(hists.items()):
+            head(name, "histogram")
+            cum = 0
+            for bound, c in zip(buckets + (float("inf"),), counts):
+                cum += c
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', le)])} {cum}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {total!r}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {n}")
+        for (name, labels), v in sorted(counters.items()):
+            head(name, "counter")
+            lines.append(f"{name}{_fmt_labels(labels)} {v}")
+        for (name, labels), v in sorted(gauges.items()):
+            head(name, "gauge")
+            lines.append(f"{name}{_fmt_labels(labels)} {v!r}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path=METRICS_FILE, min_interval=10.0):
+        # atomic, throttled export for a node-exporter textfile collector or a sidecar scrape
+        now = time.monotonic()
+        if now - self._last_write < min_interval:
+            return False
+        self._last_write = now
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+        return True
+
+    def summary(self, name):
+        # → {label values: (count, mean s, ~p50 s, ~p99 s)} for one histogram, for the admin panel
+        with self._lock:
+            return {labels: (h.count, h.sum / h.count if h.count else float("nan"), h.quantile(0.5), h.quantile(0.99))
+                    for (n, labels), h in self.histograms.items() if n == name}
+
+REGISTRY = Registry()
+observe, inc, gauge, timer, timed = REGISTRY.observe, REGISTRY.inc, REGISTRY.set, REGISTRY.time, REGISTRY.timed
+
+
+if __name__ == "__main__":
+    n = 1_000_000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with timer("bench_seconds", stage="noop"):
+            pass
+    per = (time.perf_counter() - t0) / n
+    print(f"timer overhead: {per*1e6:.2f} µs per observation ({n:,} observations)")
+    print(REGISTRY.prometheus())
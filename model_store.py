@@ -0,0 +1,166 @@
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import numpy as np
+import metrics
+
+# ── Versioned model artifacts with background hot reload ─────────────────────
+# A ModelStore holds the current Snapshot: (version, loaded_at, value), where
+# value is whatever `loader()` builds from the watched files. A daemon thread
+# stats those files every `interval` seconds; when a size or mtime changes it
+# hashes their contents, and a new hash is loaded and validated on that
+# thread, off the request path. The swap is one reference assignment.
+#
+# Readers take `snap = store.current` once per request/rerun and use only
+# `snap`, so in-flight work finishes on the version it started with and no
+# reader ever waits for a load. A version that fails to load or validate is
+# logged and skipped; the previous one keeps serving until the files change
+# again. Writers should still replace files atomically (bundle.save_bundle
+# does) so a poll never sees half a file.
+#
+# python model_store.py     → prediction latency while the bundle is being swapped
+
+RELOAD_INTERVAL = float(os.environ.get("LUNG_RELOAD_INTERVAL", "5"))
+
+class Snapshot:
+    __slots__ = ("version", "loaded_at", "value")
+
+    def __init__(self, version, loaded_at, value):
+        self.version, self.loaded_at, self.value = version, loaded_at, value
+
+def _stamp(paths):
+    # cheap change detector: (size, mtime) of every watched file that exists
+    out = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            out.append((path, None))
+            continue
+        out.append((path, st.st_size, st.st_mtime_ns))
+    return tuple(out)
+
+def content_version(paths, block=1 << 20):
+    # short sha256 over the names and bytes of the watched files that exist
+    h = hashlib.sha256()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        h.update(os.path.basename(path).encode() + b"\0")
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(block), b""):
+                h.update(chunk)
+    return h.hexdigest()[:12]
+
+class ModelStore:
+    def __init__(self, loader, paths, validate=None, interval=RELOAD_INTERVAL, name="model"):
+        self.loader, self.paths, self.validate = loader, list(paths), validate
+        self.interval, self.name = interval, name
+        self.reloads, self.failures, self.last_error = 0, 0, None
+        self._lock = threading.Lock()          # one check at a time; readers never take it
+        self._stamp = _stamp(self.paths)
+        self.current = self._load(content_version(self.paths))   # first load is synchronous and must succeed
+        self._stop = threading.Event()
+        self._thread = None
+        if interval > 0:
+            self._thread = threading.Thread(target=self._run, name=f"{name}-reload", daemon=True)
+            self._thread.start()
+
+    def _load(self, version):
+        t0 = time.perf_counter()
+        value = self.loader()
+        if self.validate is not None:
+            self.validate(value)
+        metrics.observe("lung_model_load_seconds", time.perf_counter() - t0, store=self.name)
+        metrics.gauge("lung_model_loaded_timestamp_seconds", time.time(), store=self.name)
+        return Snapshot(version, time.time(), value)
+
+    def check(self):
+        # one poll: → True if a new version was swapped in
+        with self._lock:
+            stamp = _stamp(self.paths)
+            if stamp == self._stamp:
+                return False
+            self._stamp = stamp
+            version = content_version(self.paths)
+            if version == self.current.version:
+                return False                   # touched or rewritten with the same bytes
+            try:
+                snap = self._load(version)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = f"{version}: {type(e).__name__}: {e}"
+                metrics.inc("lung_model_reloads_total", store=self.name, result="failed")
+                print(f"⚠️  {self.name} {version} rejected, still serving {self.current.version}\n"
+                      f"{traceback.format_exc()}", file=sys.stderr, flush=True)
+                return False
+            self.current = snap
+            self.reloads += 1
+            self.last_error = None
+            metrics.inc("lung_model_reloads_total", store=self.name, result="ok")
+            return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:                  # never let the watcher die (e.g. a file vanishing mid-hash)
+                traceback.print_exc()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+# ── Swap-under-load measurement ──────────────────────────────────────────────
+def measure(seconds=6.0, swap_every=0.25):
+    from bundle import BUNDLE_FILE, load_bundle, read_header, save_bundle
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, BUNDLE_FILE)
+        shutil.copy(os.path.join(here, BUNDLE_FILE), path)
+        store = ModelStore(lambda: load_bundle(path), [path], interval=0.01, name="measure")
+        engine, header = store.current.value
+        row = np.array([[1, 65] + [1] * 13], dtype=np.float32)
+
+        def lat(duration):
+            out, end = [], time.perf_counter() + duration
+            while time.perf_counter() < end:
+                t0 = time.perf_counter()
+                eng = store.current.value[0]
+                eng.predict(row)
+                out.append(time.perf_counter() - t0)
+            return np.array(out) * 1e6
+
+        quiet = lat(seconds / 2)
+        stop = threading.Event()
+        def writer():
+            h = read_header(path)
+            enc = h["encodings"]
+            i = 0
+            while not stop.wait(swap_every):
+                i += 1
+                save_bundle(path, engine, dict(h["artifacts"], revision=i), enc["GENDER"], enc["LUNG_CANCER"])
+        w = threading.Thread(target=writer)
+        w.start()
+        busy = lat(seconds / 2)
+        stop.set(); w.join(); store.close()
+        for label, x in (("no reloads", quiet), (f"reload every {swap_every}s", busy)):
+            print(f"{label:>20}: {len(x):7,} predictions · p50 {np.percentile(x, 50):7.1f} µs · "
+                  f"p99 {np.percentile(x, 99):7.1f} µs · max {x.max()/1e3:6.2f} ms")
+        print(f"swaps: {store.reloads} · failed: {store.failures} · serving {store.current.version}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Measure prediction latency while the model bundle is hot-swapped")
+    ap.add_argument("--seconds", type=float, default=6.0)
+    ap.add_argument("--swap-every", type=float, default=0.25)
+    args = ap.parse_args()
+    measure(args.seconds, args.swap_every)
@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import pickle
+import time
+import numpy as np
+import pandas as pd
+from bundle import BUNDLE_FILE, load_engine
+from flat_ensemble import FlatEnsemble
+
+# ── Exhaustive risk table ────────────────────────────────────────────────────
+# The model's input domain is finite: GENDER (2) × 13 binary symptoms × integer
+# AGE. Scoring every combination once turns a prediction into an index lookup.
+#
+# Layout: table[age - age_min, gender, symptom_bits], where bit j of
+# symptom_bits is feature_names[2 + j]. Stored as .npy (memory-mapped on load)
+# plus a JSON header tying the table to the model fingerprint it was built from.
+
+TABLE_FILE = "lung_risk_table.npy"
+META_FILE  = "lung_risk_table.json"
+N_SYMPTOMS = 13
+U16_MAX    = 65535
+
+def grid(age_min, age_max):
+    ages = np.arange(age_min, age_max + 1)
+    bits = np.arange(1 << N_SYMPTOMS)
+    symptoms = (bits[:, None] >> np.arange(N_SYMPTOMS)) & 1           # (8192, 13)
+    a, g, b = np.meshgrid(np.arange(len(ages)), [0, 1], bits, indexing="ij")
+    X = np.empty((a.size, 2 + N_SYMPTOMS), dtype=np.float32)
+    X[:, 0] = g.ravel()
+    X[:, 1] = ages[a.ravel()]
+    X[:, 2:] = symptoms[b.ravel()]
+    return X
+
+def encode(proba, labels, dtype):
+    # keep `value > 0.5` identical to the model's label after rounding
+    if dtype == "uint16":
+        q = np.rint(proba * U16_MAX)
+        q = np.where(labels == 1, np.maximum(q, U16_MAX // 2 + 1), np.minimum(q, U16_MAX // 2))
+        return q.astype(np.uint16)
+    t = proba.astype(np.float32)
+    t = np.where((labels == 1) & (t <= 0.5), np.nextafter(np.float32(0.5), np.float32(1)), t)
+    t = np.where((labels == 0) & (t > 0.5), np.float32(0.5), t)
+    return t.astype(np.float32)
+
+def build(engine, age_min=21, age_max=87, dtype="float32"):
+    # score the whole domain in memory → (X, labels, proba, table, meta); nothing is written
+    X = grid(age_min, age_max)
+    labels, proba = engine.predict(X)
+    table = encode(proba, labels, dtype).reshape(age_max - age_min + 1, 2, 1 << N_SYMPTOMS)
+    meta = {
+        "age_min": age_min, "age_max": age_max, "dtype": dtype,
+        "feature_names": engine.feature_names,
+        "model_fingerprint": engine.fingerprint(),
+    }
+    return X, labels, proba, table, meta
+
+def save(table, meta, out_dir="."):
+    # publish a verified table. Write-then-rename: a running app may hold the old
+    # table memory-mapped (truncating a mapped file in place kills it with SIGBUS),
+    # and the app's ModelStore hot-loads whatever lands here
+    path = os.path.join(out_dir, TABLE_FILE)
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, table)
+    os.replace(path + ".tmp", path)
+    path = os.path.join(out_dir, META_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def verify(ref_proba, ref_labels, table, dtype):
+    # compare the encoded table against reference scores on every cell
+    flat = table.reshape(-1).astype(np.float64)
+    if dtype == "uint16":
+        flat /= U16_MAX
+    err = np.abs(flat - ref_proba)
+    mismatched = int(((flat > 0.5).astype(int) != ref_labels).sum())
+    return float(err.max()), mismatched
+
+def sklearn_reference(path, engine):
+    # the fitted model behind `engine`, if `path` holds it (same flattened fingerprint); else None
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f: model = pickle.load(f)
+    try:
+        same = FlatEnsemble.from_model(model).fingerprint() == engine.fingerprint()
+    except TypeError:
+        return None
+    return model if same else None
+
+
+class RiskTable:
+    def __init__(self, table, meta):
+        self.table = table
+        self.meta = meta
+        self.age_min = meta["age_min"]
+        self.age_max = meta["age_max"]
+        self.scale = U16_MAX if meta["dtype"] == "uint16" else 1
+
+    @classmethod
+    def load(cls, table_path, meta_path, fingerprint=None):
+        # None when missing or built from a different model
+        if not (os.path.exists(table_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if fingerprint is not None and meta.get("model_fingerprint") != fingerprint:
+            return None
+        return cls(np.load(table_path, mmap_mode="r"), meta)
+
+    def lookup(self, input_row):
+        # input_row = [gender, age, *13 symptoms] → P(YES), or None outside the table
+        gender, age = int(input_row[0]), input_row[1]
+        if age != int(age) or not (self.age_min <= age <= self.age_max):
+            return None
+        bits = 0
+        for j, v in enumerate(input_row[2:]):
+            bits |= int(v) << j
+        return float(self.table[int(age) - self.age_min, gender, bits]) / self.scale
+
+    def lookup_batch(self, X):
+        # → (proba, hit); rows with hit == False must be scored by the live model
+        X = np.asarray(X)
+        age = X[:, 1]
+        hit = (age == np.floor(age)) & (age >= self.age_min) & (age <= self.age_max)
+        a = np.where(hit, age - self.age_min, 0).astype(np.intp)
+        bits = X[:, 2:].astype(np.intp) @ (1 << np.arange(N_SYMPTOMS))
+        proba = self.table[a, X[:, 0].astype(np.intp), bits].astype(np.float64) / self.scale
+        return np.where(hit, proba, np.nan), hit
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Precompute the exhaustive lung-cancer risk table")
+    ap.add_argument("--model", default=BUNDLE_FILE, help="model bundle (or legacy .pkl) to tabulate")
+    ap.add_argument("--reference", default="lung_xgb_model.pkl",
+                    help="sklearn model pickle to also verify against (used only if it is the model being tabulated)")
+    ap.add_argument("--age-min", type=int, default=21)
+    ap.add_argument("--age-max", type=int, default=87)
+    ap.add_argument("--dtype", choices=["float32", "uint16"], default="float32")
+    ap.add_argument("--tol", type=float, default=None, help="max |table - model| allowed (default: dtype resolution)")
+    args = ap.parse_args()
+
+    engine = load_engine(args.model)
+
+    t0 = time.perf_counter()
+    X, labels, proba, table, meta = build(engine, args.age_min, args.age_max, args.dtype)
+    t_build = time.perf_counter() - t0
+    print(f"Scored {len(X):,} inputs in {t_build:.2f}s ({table.nbytes/1e6:.1f} MB, {args.dtype})")
+
+    # verify in memory, publish only on success: the app hot-loads the files, and a
+    # failed rebuild must leave the previous (verified) table in place
+    tol = args.tol if args.tol is not None else (1.0 / U16_MAX if args.dtype == "uint16" else 1e-6)
+    checks = [("model", proba, labels)]
+    model = sklearn_reference(args.reference, engine)
+    if model is not None:
+        Xdf = pd.DataFrame(X, columns=engine.feature_names)
+        checks.append((os.path.basename(args.reference), model.predict_proba(Xdf)[:, 1], model.predict(Xdf)))
+    else:
+        print(f"   {args.reference} is not the model in {args.model}; verifying against the bundle only")
+    for name, p_ref, lab_ref in checks:
+        max_err, mismatched = verify(p_ref, lab_ref, table, args.dtype)
+        print(f"Verification vs {name}: max |Δp| = {max_err:.2e}, label mismatches = {mismatched}")
+        if max_err > tol or mismatched:
+            raise SystemExit(f"❌ Table disagrees with {name} (tol {tol:.1e}) — not saved; the existing table is untouched.")
+    save(table, meta)
+    print(f"✅ Risk table saved to {TABLE_FILE}!")
@@ -0,0 +1,177 @@
+import argparse
+import io
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from bundle import BUNDLE_FILE, load_engine
+from risk_table import RiskTable, TABLE_FILE, META_FILE
+from survey import TARGET_CLASSES, clean_columns, encode_features
+
+# ── Streaming batch scorer for raw survey exports ────────────────────────────
+# python score_batch.py screening.csv scored.csv --workers 8
+#
+# The input is read in chunks; each chunk is encoded and scored in a worker
+# process. At most `2 × workers` chunks are in flight and results are written
+# in submission order, so memory stays bounded and output rows line up with
+# input rows. Rows that fail validation get an empty probability and INVALID.
+
+PROBA_COL = "LUNG_CANCER_PROBA"
+PRED_COL  = "LUNG_CANCER_PRED"
+
+_engine = None
+_table  = None
+
+def _init_worker(model_path, table_dir):
+    global _engine, _table
+    _engine = load_engine(model_path)
+    _table = RiskTable.load(os.path.join(table_dir, TABLE_FILE), os.path.join(table_dir, META_FILE),
+                            _engine.fingerprint())
+
+def score_frame(df, engine=None, table=None, monitor=None):
+    if engine is None:                          # worker process: its own model (see _init_worker)
+        engine, table = _engine, _table
+    X, valid = encode_features(clean_columns(df))
+    if monitor is not None:                     # drift.DriftSketch: fold the valid rows in
+        monitor.update(X[valid])
+    proba = np.full(len(df), np.nan)
+    todo = valid.copy()
+    if table is not None:
+        p_tab, hit = table.lookup_batch(X)
+        hit &= valid
+        proba[hit] = p_tab[hit]
+        todo &= ~hit
+    if todo.any():
+        proba[todo] = engine.predict(X[todo])[1]
+    pred = np.where(proba > 0.5, TARGET_CLASSES[1], TARGET_CLASSES[0])
+    df[PROBA_COL] = proba.round(6)
+    df[PRED_COL] = np.where(valid, pred, "INVALID")
+    return df, int((~valid).sum())
+
+def run(input_path, output_path, model_path, chunksize, workers, table_dir):
+    t0 = time.perf_counter()
+    rows = invalid = 0
+    header = True
+    inflight = deque()
+    reader = pd.read_csv(input_path, chunksize=chunksize)
+
+    def drain_one(out):
+        nonlocal rows, invalid, header
+        df, bad = inflight.popleft().result()
+        df.to_csv(out, header=header, index=False)
+        header = False
+        rows += len(df); invalid += bad
+        elapsed = time.perf_counter() - t0
+        print(f"\r{rows:,} rows · {rows/elapsed:,.0f} rows/s", end="", file=sys.stderr, flush=True)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_path, table_dir)) as pool, \
+         open(output_path, "w", newline="") as out:
+        for chunk in reader:
+            inflight.append(pool.submit(score_frame, chunk))
+            if len(inflight) >= 2 * workers:
+                drain_one(out)
+        while inflight:
+            drain_one(out)
+
+    elapsed = time.perf_counter() - t0
+    print(file=sys.stderr)
+    return rows, invalid, elapsed
+
+
+# ── In-process job for the app's upload tab ──────────────────────────────────
+# The app submits BatchJob.run to a small shared thread pool, so a long file
+# never holds up a script run; the UI polls rows/progress/preview() from a
+# fragment. Chunks are scored with the model snapshot the job started on
+# (numpy releases the GIL in the heavy parts, so other sessions keep going).
+# Results stay in memory as scored chunks; to_csv() is built once, on demand.
+
+BATCH_CHUNK = 50_000
+UPLOAD_EXTS = (".csv", ".xlsx")
+
+def read_upload(data, name, chunksize=BATCH_CHUNK, nrows=None):
+    # uploaded bytes → (iterator of raw-schema chunks, row count for progress).
+    # CSV is streamed, so its count is newlines minus the header; Excel (needs
+    # openpyxl) is read whole, so its count is exact.
+    if name.lower().endswith(".xlsx"):
+        df = pd.read_excel(io.BytesIO(data), nrows=nrows, engine="openpyxl")
+        return iter([df[s:s + chunksize] for s in range(0, max(len(df), 1), chunksize)]), len(df)
+    if nrows is not None:
+        df = pd.read_csv(io.BytesIO(data), nrows=nrows)
+        return iter([df]), len(df)
+    return pd.read_csv(io.BytesIO(data), chunksize=chunksize), max(data.count(b"\n") - 1, 1)
+
+class BatchJob:
+    def __init__(self, data, name, engine, table, chunksize=BATCH_CHUNK, monitor=None):
+        self.data, self.name, self.engine, self.table, self.chunksize = data, name, engine, table, chunksize
+        self.monitor = monitor
+        self.total = None                       # rows for the progress bar, known once run() opens the upload
+        self.rows = self.invalid = self.positive = 0
+        self.chunks = []
+        self.started = self.finished = None
+        self.error = None
+        self.cancelled = False
+        self._csv = None
+
+    @property
+    def done(self):
+        return self.finished is not None
+
+    def run(self):
+        self.started = time.perf_counter()
+        try:
+            chunks, self.total = read_upload(self.data, self.name, self.chunksize)
+            for chunk in chunks:
+                if self.cancelled:
+                    break
+                df, bad = score_frame(chunk, self.engine, self.table, self.monitor)
+                self.chunks.append(df)
+                self.invalid += bad
+                self.positive += int((df[PRED_COL] == TARGET_CLASSES[1]).sum())
+                self.rows += len(df)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.data = None                    # drop the upload; results live in self.chunks
+            self.finished = time.perf_counter()
+
+    def progress(self):
+        if self.done:
+            return 1.0
+        return min(self.rows / self.total, 0.99) if self.total else 0.0
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def preview(self, n=200):
+        chunks = list(self.chunks)              # the worker may append meanwhile
+        return chunks[0].head(n) if chunks else None
+
+    def to_csv(self):
+        if self._csv is None:
+            buf = io.StringIO()
+            for i, df in enumerate(self.chunks):
+                df.to_csv(buf, header=i == 0, index=False)
+            self._csv = buf.getvalue().encode()
+        return self._csv
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Score a raw lung-cancer survey export in parallel")
+    ap.add_argument("input", help="CSV in the raw survey schema (M/F gender, 1/2 symptoms)")
+    ap.add_argument("output", help="CSV to write: input columns + probability + prediction")
+    ap.add_argument("--model", default=BUNDLE_FILE, help="model bundle (or legacy .pkl)")
+    ap.add_argument("--chunksize", type=int, default=100_000)
+    ap.add_argument("--workers", type=int, default=os.cpu_count())
+    ap.add_argument("--table-dir", default=".", help="where to look for a prebuilt risk table")
+    args = ap.parse_args()
+
+    rows, invalid, elapsed = run(args.input, args.output, args.model,
+                                 args.chunksize, args.workers, args.table_dir)
+    print(f"✅ Scored {rows:,} rows in {elapsed:.2f}s ({rows/max(elapsed,1e-9):,.0f} rows/s)"
+          + (f" · {invalid:,} invalid" if invalid else ""))
@@ -0,0 +1,243 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import traceback
+import numpy as np
+import metrics
+from bundle import BUNDLE_FILE, load_engine
+from survey import TARGET_CLASSES, encode_record
+
+# ── Async HTTP inference service with micro-batching ─────────────────────────
+# python serve.py --port 8601 --max-batch 64 --window-ms 2
+#   POST /predict  body: one raw-schema patient object, or a list of them
+#                  {"GENDER": "M", "AGE": 69, "SMOKING": 1, ... "CHEST PAIN": 2}
+#   GET  /health
+#   GET  /metrics  Prometheus text: request latency, batches, rows, RSS
+#
+# Requests arriving within `window_ms` of each other (or until `max_batch`
+# rows are waiting) are stacked and scored with one vectorized call.
+#
+# python serve.py bench --concurrency 64 --requests 20000
+#   starts the server twice — unbatched (1 row per call) and batched — and
+#   reports p50/p99 latency and throughput for each.
+
+class MicroBatcher:
+    def __init__(self, engine, max_batch=64, window_ms=2.0):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.window = window_ms / 1000.0
+        self.pending = []
+        self.timer = None
+        self.batches = 0
+        self.rows = 0
+
+    def submit(self, row):
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self.pending.append((row, fut))
+        if len(self.pending) >= self.max_batch or self.window <= 0:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self.flush)
+        return fut
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        try:                                    # every future in the batch must resolve, or its request hangs
+            X = np.array([row for row, _ in batch], dtype=np.float32)
+            with metrics.timer("lung_serve_batch_seconds"):
+                labels, proba = self.engine.predict(X)
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done(): fut.set_exception(e)
+            return
+        self.batches += 1
+        self.rows += len(batch)
+        metrics.inc("lung_serve_batches_total")
+        metrics.inc("lung_serve_rows_total", len(batch))
+        for (_, fut), lab, p in zip(batch, labels, proba):
+            if not fut.done():
+                fut.set_result((TARGET_CLASSES[int(lab)], float(p)))
+
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+def http_response(status, payload, keep_alive, content_type="application/json"):
+    body = payload.encode() if isinstance(payload, str) else json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + body
+
+async def read_request(reader):
+    # → (method, path, headers, body) or None on EOF
+    line = await reader.readline()
+    if not line:
+        return None
+    method, path, _ = line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        k, _, v = h.decode("latin-1").partition(":")
+        headers[k.strip().lower()] = v.strip()
+    n = int(headers.get("content-length", 0))
+    body = await reader.readexactly(n) if n else b""
+    return method, path, headers, body
+
+async def handle_predict(batcher, model_id, body):
+    try:
+        payload = json.loads(body)
+        records = payload if isinstance(payload, list) else [payload]
+        rows = [encode_record(r) for r in records]
+    except (ValueError, TypeError, AttributeError) as e:
+        return 400, {"error": str(e)}
+    try:
+        results = await asyncio.gather(*(batcher.submit(r) for r in rows))
+    except Exception as e:
+        traceback.print_exc()
+        return 500, {"error": f"{type(e).__name__}: {e}"}
+    out = [{"prediction": lab, "probability": round(p, 6)} for lab, p in results]
+    if not isinstance(payload, list):
+        out = out[0]
+    return 200, {"model": model_id, "result": out}
+
+def make_handler(batcher, model_id):
+    async def handle(reader, writer):
+        try:
+            while True:
+                req = await read_request(reader)
+                if req is None:
+                    break
+                method, path, headers, body = req
+                keep_alive = headers.get("connection", "").lower() != "close"
+                content_type = "application/json"
+                if path == "/predict":
+                    if method != "POST":
+                        status, payload = 405, {"error": "use POST"}
+                    else:
+                        with metrics.timer("lung_serve_request_seconds"):
+                            status, payload = await handle_predict(batcher, model_id, body)
+                        metrics.inc("lung_serve_requests_total", code=status)
+                elif path == "/metrics":
+                    status, payload = 200, metrics.REGISTRY.prometheus()
+                    content_type = "text/plain; version=0.0.4"
+                elif path == "/health":
+                    status, payload = 200, {"status": "ok", "model": model_id,
+                                            "batches": batcher.batches, "rows": batcher.rows}
+                else:
+                    status, payload = 404, {"error": f"no route {path}"}
+                writer.write(http_response(status, payload, keep_alive, content_type))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+async def serve(host, port, model_path, max_batch, window_ms):
+    engine = load_engine(model_path)
+    batcher = MicroBatcher(engine, max_batch, window_ms)
+    server = await asyncio.start_server(make_handler(batcher, engine.fingerprint()[:12]), host, port)
+    print(f"🫁 Serving on http://{host}:{port}/predict (max_batch={max_batch}, window={window_ms}ms)", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+# ── Load-testing client ──────────────────────────────────────────────────────
+SAMPLE = {"GENDER": "M", "AGE": 69, "SMOKING": 1, "YELLOW_FINGERS": 2, "ANXIETY": 2,
+          "PEER_PRESSURE": 1, "CHRONIC DISEASE": 1, "FATIGUE": 2, "ALLERGY": 1,
+          "WHEEZING": 2, "ALCOHOL CONSUMING": 2, "COUGHING": 2, "SHORTNESS OF BREATH": 2,
+          "SWALLOWING DIFFICULTY": 2, "CHEST PAIN": 2}
+
+async def client_worker(host, port, n, latencies, seed):
+    reader, writer = await asyncio.open_connection(host, port)
+    rng = np.random.default_rng(seed)
+    for _ in range(n):
+        rec = dict(SAMPLE, AGE=int(rng.integers(21, 88)))
+        body = json.dumps(rec).encode()
+        t0 = time.perf_counter()
+        writer.write(f"POST /predict HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+        await read_response(reader)
+        latencies.append(time.perf_counter() - t0)
+    writer.close()
+
+async def read_response(reader):
+    status = await reader.readline()
+    headers = {}
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b""):
+            break
+        k, _, v = h.decode().partition(":")
+        headers[k.strip().lower()] = v.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, body
+
+async def load_test(host, port, concurrency, total):
+    latencies = []
+    per = max(1, total // concurrency)
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client_worker(host, port, per, latencies, i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    lat = np.array(latencies) * 1000
+    return {"requests": len(lat), "rps": len(lat) / elapsed,
+            "p50_ms": float(np.percentile(lat, 50)), "p99_ms": float(np.percentile(lat, 99))}
+
+def wait_ready(host, port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f"server on {host}:{port} did not come up")
+
+def bench(args):
+    configs = [("one call per request", 1, 0.0), ("micro-batched", args.max_batch, args.window_ms)]
+    for i, (label, max_batch, window_ms) in enumerate(configs):
+        port = args.port + i
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--host", args.host,
+                                 "--port", str(port), "--model", args.model,
+                                 "--max-batch", str(max_batch), "--window-ms", str(window_ms)],
+                                stdout=subprocess.DEVNULL)
+        try:
+            wait_ready(args.host, port)
+            r = asyncio.run(load_test(args.host, port, args.concurrency, args.requests))
+        finally:
+            proc.terminate(); proc.wait()
+        print(f"{label:>22}: {r['rps']:8,.0f} req/s · p50 {r['p50_ms']:6.2f} ms · p99 {r['p99_ms']:6.2f} ms")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Lung-cancer risk inference service")
+    ap.add_argument("mode", nargs="?", choices=["serve", "bench"], default="serve")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8601)
+    ap.add_argument("--model", default=BUNDLE_FILE, help="model bundle (or legacy .pkl)")
+    ap.add_argument("--max-batch", type=int, default=64)
+    ap.add_argument("--window-ms", type=float, default=2.0)
+    ap.add_argument("--concurrency", type=int, default=64, help="bench: concurrent keep-alive clients")
+    ap.add_argument("--requests", type=int, default=20000, help="bench: total requests per config")
+    args = ap.parse_args()
+
+    if args.mode == "bench":
+        bench(args)
+    else:
+        asyncio.run(serve(args.host, args.port, args.model, args.max_batch, args.window_ms))
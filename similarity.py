@@ -0,0 +1,58 @@
+import numpy as np
+from survey import BINARY_COLS
+
+# ── Packed-bitset index for "Similar Patients" ───────────────────────────────
+# Each record's 13 symptoms are packed into one uint16 (bit j = BINARY_COLS[j],
+# raw value 2 = present). Matching symptoms are then popcount(mask & query)
+# over the whole registry in one vectorized pass, and top-k is a partial
+# selection instead of a full sort.
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(1 << len(BINARY_COLS))], dtype=np.uint8)
+_AGE_CAP = 255
+
+def popcount(x):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    return _POPCOUNT[x]
+
+def symptom_mask(symptoms):
+    # iterable of present symptom names → packed query mask
+    present = set(symptoms)
+    return sum(1 << j for j, c in enumerate(BINARY_COLS) if c in present)
+
+class SymptomIndex:
+    def __init__(self, masks, ages):
+        self.masks = np.ascontiguousarray(masks, dtype=np.uint16)
+        self.ages  = np.ascontiguousarray(ages, dtype=np.int16)
+
+    @classmethod
+    def from_frame(cls, df):
+        # raw survey frame (1/2 symptom coding, stripped column names)
+        present = (df[BINARY_COLS].to_numpy() == 2).astype(np.uint16)
+        masks = present @ (1 << np.arange(len(BINARY_COLS), dtype=np.uint16))
+        return cls(masks, df['AGE'].to_numpy())
+
+    def __len__(self):
+        return len(self.masks)
+
+    def scores(self, query_mask, age=None):
+        # symptom matches dominate; age distance (if given) only breaks ties
+        key = popcount(self.masks & np.uint16(query_mask)).astype(np.int32) * (_AGE_CAP + 1)
+        if age is not None:
+            key -= np.minimum(np.abs(self.ages - int(age)), _AGE_CAP)
+        return key
+
+    def top_k(self, query_mask, k=8, age=None):
+        # row positions of the k best matches, best first; ties keep registry order
+        key = self.scores(query_mask, age)
+        n = len(key)
+        if k >= n:
+            sel = np.arange(n)
+        else:
+            kth = np.partition(key, n - k)[n - k]
+            above = np.flatnonzero(key > kth)
+            sel = np.concatenate([above, np.flatnonzero(key == kth)[:k - len(above)]])
+        return sel[np.lexsort((sel, -key[sel]))]
+
+    def matches(self, query_mask, rows):
+        return popcount(self.masks[rows] & np.uint16(query_mask))
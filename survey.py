@@ -0,0 +1,233 @@
+import argparse
+import os
+import subprocess
+import sys
+import warnings
+import numpy as np
+import pandas as pd
+
+# ── Survey schema & encoding shared by training, the app and batch scoring ──
+# Raw survey rows use M/F gender, 1/2 symptom coding (1 = No, 2 = Yes) and a
+# YES/NO target. The model sees GENDER as LabelEncoder order (F=0, M=1), AGE
+# as-is and every symptom shifted to 0/1 — exactly what train_model.py fits on.
+
+RAW_CSV        = "survey lung cancer.csv"
+TARGET         = "LUNG_CANCER"
+BINARY_COLS    = ['SMOKING','YELLOW_FINGERS','ANXIETY','PEER_PRESSURE',
+                  'CHRONIC DISEASE','FATIGUE','ALLERGY','WHEEZING',
+                  'ALCOHOL CONSUMING','COUGHING','SHORTNESS OF BREATH',
+                  'SWALLOWING DIFFICULTY','CHEST PAIN']
+FEATURE_NAMES  = ['GENDER','AGE'] + BINARY_COLS
+GENDER_CLASSES = ['F','M']
+TARGET_CLASSES = ['NO','YES']
+
+def clean_columns(df):
+    # raw headers carry trailing spaces ("FATIGUE ", "ALLERGY ")
+    df.columns = df.columns.str.strip()
+    return df
+
+# ── Compact in-memory registry ───────────────────────────────────────────────
+# Same raw values (M/F, 1/2, YES/NO), so `== 2` / `== 'YES'` comparisons keep
+# working, but one byte per cell: uint8 age and symptom codes, categorical
+# gender and target. 16 bytes per row instead of ~130 with int64 + str.
+COMPACT_DTYPES = {'AGE': np.uint8, 'GENDER': pd.CategoricalDtype(GENDER_CLASSES),
+                  **{c: np.uint8 for c in BINARY_COLS}, TARGET: pd.CategoricalDtype(TARGET_CLASSES)}
+
+def compact_frame(df):
+    # any raw survey frame → compact dtypes; columns that do not fit (ages > 255, odd codes) stay as they are
+    out = {}
+    for c in df.columns:
+        dt, col = COMPACT_DTYPES.get(c), df[c]
+        if isinstance(dt, pd.CategoricalDtype):
+            col = col.astype(str).str.strip().str.upper().astype(dt) if col.dtype != dt else col
+        elif dt is not None and col.dtype != dt:
+            v = pd.to_numeric(col, errors='coerce')
+            if v.notna().all() and v.between(0, 255).all() and (v % 1 == 0).all():
+                col = v.astype(dt)
+        out[c] = col
+    return pd.DataFrame(out, index=df.index, copy=False)
+
+def _csv_dtypes(path):
+    raw = pd.read_csv(path, nrows=0).columns
+    return {r: COMPACT_DTYPES[r.strip()] for r in raw if r.strip() in COMPACT_DTYPES}
+
+def _read_csv(path, columns=None):
+    # parsed straight into the narrow dtypes (no int64/str intermediate)
+    usecols = None if columns is None else (lambda c: c.strip() in columns)
+    try:
+        df = pd.read_csv(path, dtype=_csv_dtypes(path), usecols=usecols)
+    except (ValueError, OverflowError, TypeError):
+        # out-of-range or malformed values: convert what fits
+        return compact_frame(clean_columns(pd.read_csv(path, usecols=usecols)))
+    return clean_columns(df)
+
+# ── Columnar copy of the registry ────────────────────────────────────────────
+# python survey.py convert               → "survey lung cancer.arrow" next to the CSV
+# python survey.py convert --out x.parquet
+# python survey.py measure               → cold load time / peak RSS, CSV vs columnar
+#
+# Arrow IPC (the default) is memory-mapped and its uint8 columns become the
+# DataFrame's buffers without a copy, so a cold load only touches the pages
+# of the columns asked for, and server processes share them via the page
+# cache. Parquet is smaller on disk but has to be decoded. The file records
+# the CSV's size and mtime; if the CSV changes, readers fall back to it until
+# the file is converted again. Needs pyarrow; without it the CSV is read.
+
+COLUMNAR_EXTS = (".arrow", ".feather", ".parquet")
+
+def _stamp(path):
+    st = os.stat(path)
+    return {b"source_size": str(st.st_size).encode(), b"source_mtime_ns": str(st.st_mtime_ns).encode()}
+
+def _read_schema(path):
+    import pyarrow as pa
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return pq.read_schema(path, memory_map=True)
+    return pa.ipc.open_file(pa.memory_map(path)).schema
+
+def columnar_path(path):
+    # an up-to-date columnar copy of the CSV at `path`, or None
+    stem = os.path.splitext(path)[0]
+    for ext in COLUMNAR_EXTS:
+        cand = stem + ext
+        if not os.path.exists(cand):
+            continue
+        try:
+            meta = _read_schema(cand).metadata or {}
+        except ImportError:
+            return None
+        if not os.path.exists(path) or all(meta.get(k) == v for k, v in _stamp(path).items()):
+            return cand
+        warnings.warn(f"{cand} is out of date with {path}; reading the CSV (re-run `python survey.py convert`)")
+    return None
+
+def _read_columnar(path, columns=None):
+    import pyarrow as pa
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=columns, memory_map=True)
+    else:
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        if columns is not None:
+            table = table.select([c for c in table.column_names if c in columns])
+    return compact_frame(table.to_pandas(split_blocks=True))
+
+def read_survey(path, columns=None):
+    # CSV / Arrow / Parquet → compact frame of `columns` (default all).
+    # A CSV with an up-to-date columnar copy is read from the copy.
+    if not path.lower().endswith(COLUMNAR_EXTS):
+        path = columnar_path(path) or path
+    if path.lower().endswith(COLUMNAR_EXTS):
+        return _read_columnar(path, columns)
+    return _read_csv(path, columns)
+
+def convert_survey(src=RAW_CSV, out=None, chunksize=1_000_000):
+    # CSV → columnar file in the compact dtypes. The CSV is parsed in chunks;
+    # the compact rows (16 B each) are then written as one record batch, so
+    # every Arrow column is a single buffer the reader can map without copying.
+    import pyarrow as pa
+    out = out or os.path.splitext(src)[0] + ".arrow"
+    if not out.lower().endswith(COLUMNAR_EXTS):
+        raise ValueError(f"{out}: columnar output must end in one of {', '.join(COLUMNAR_EXTS)}")
+    chunks = [pa.Table.from_pandas(clean_columns(c), preserve_index=False)
+              for c in pd.read_csv(src, dtype=_csv_dtypes(src), chunksize=chunksize)]
+    table = pa.concat_tables(chunks).combine_chunks()
+    del chunks
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **_stamp(src)})
+    tmp = out + ".tmp"
+    if out.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        pq.write_table(table, tmp)
+    else:
+        with pa.ipc.new_file(tmp, table.schema) as writer:
+            writer.write_table(table, max_chunksize=max(len(table), 1))
+    os.replace(tmp, out)    # readers never see a half-written file
+    return out, len(table)
+
+def encode_features(df):
+    # raw survey frame → (float32 feature matrix, valid-row mask); invalid rows are zero-filled
+    missing = [c for c in FEATURE_NAMES if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    n = len(df)
+    X = np.zeros((n, len(FEATURE_NAMES)), dtype=np.float32)
+    gender = df['GENDER'].astype(str).str.strip().str.upper()
+    X[:, 0] = (gender == 'M').to_numpy()
+    valid = gender.isin(GENDER_CLASSES).to_numpy().copy()
+    age = pd.to_numeric(df['AGE'], errors='coerce').to_numpy(dtype=np.float64)
+    valid &= np.isfinite(age)
+    X[:, 1] = np.where(np.isfinite(age), age, 0)
+    sym = df[BINARY_COLS].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    valid &= np.isin(sym, (1, 2)).all(axis=1)
+    X[:, 2:] = np.where(np.isin(sym, (1, 2)), sym - 1, 0)
+    return X, valid
+
+def encode_record(rec):
+    # one raw-schema JSON object → feature row (list of floats); raises ValueError on bad input
+    rec = {str(k).strip(): v for k, v in rec.items()}
+    missing = [c for c in FEATURE_NAMES if c not in rec]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+    gender = str(rec['GENDER']).strip().upper()
+    if gender not in GENDER_CLASSES:
+        raise ValueError(f"GENDER must be one of {GENDER_CLASSES}, got {rec['GENDER']!r}")
+    try:
+        if isinstance(rec['AGE'], bool):
+            raise TypeError
+        age = float(rec['AGE'])
+    except (TypeError, ValueError):
+        raise ValueError(f"AGE must be numeric, got {rec['AGE']!r}") from None
+    if not np.isfinite(age):                    # same rule as encode_features: nan/inf is INVALID
+        raise ValueError(f"AGE must be finite, got {rec['AGE']!r}")
+    row = [float(GENDER_CLASSES.index(gender)), age]
+    for c in BINARY_COLS:
+        v = rec[c]
+        if isinstance(v, bool) or v not in (1, 2):     # JSON true == 1 in Python
+            raise ValueError(f"{c} must be 1 (No) or 2 (Yes), got {v!r}")
+        row.append(float(v - 1))
+    return row
+
+
+# ── Cold-load measurement: fresh interpreter per format ──────────────────────
+_PROBE = r"""
+import resource, time
+t0 = time.perf_counter()
+from survey import {reader} as read
+df = read({path!r})
+n = int((df[{col!r}] == 2).sum())
+print(time.perf_counter() - t0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, len(df))
+"""
+
+def measure(src, repeats=3):
+    here = os.path.dirname(os.path.abspath(__file__))
+    src = os.path.abspath(src)
+    base = subprocess.run([sys.executable, "-c", "import resource,pandas;print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"],
+                          capture_output=True, text=True, check=True)
+    print(f"baseline interpreter + pandas: {int(base.stdout) / 1024:.1f} MB max RSS")
+    # the CSV probe reads the CSV itself, not its columnar copy
+    probes = [("csv", "_read_csv", src)] + [(ext[1:], "read_survey", os.path.splitext(src)[0] + ext) for ext in COLUMNAR_EXTS]
+    for name, reader, path in probes:
+        if not os.path.exists(path):
+            continue
+        code = _PROBE.format(reader=reader, path=path, col=BINARY_COLS[0])
+        runs = []
+        for _ in range(repeats):
+            r = subprocess.run([sys.executable, "-W", "ignore", "-c", code], capture_output=True, text=True, cwd=here, check=True)
+            runs.append([float(x) for x in r.stdout.split()])
+        load_s, kb, n = np.median(np.array(runs), axis=0)
+        print(f"{name:>8}: {int(n):,} rows · load {load_s*1000:8.1f} ms · max RSS {kb/1024:7.1f} MB")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Convert the survey CSV to a columnar file, or compare load costs")
+    ap.add_argument("command", choices=["convert", "measure"])
+    ap.add_argument("--src", default=RAW_CSV)
+    ap.add_argument("--out", help="columnar output: .arrow/.feather (memory-mapped) or .parquet")
+    ap.add_argument("--chunksize", type=int, default=1_000_000)
+    args = ap.parse_args()
+
+    if args.command == "convert":
+        out, rows = convert_survey(args.src, args.out, args.chunksize)
+        print(f"✅ Wrote {out} ({rows:,} rows, {os.path.getsize(out)/1024**2:.1f} MB)")
+    else:
+        measure(args.src)
@@ -0,0 +1,169 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr, ndtri
+from scipy.stats import multivariate_normal
+from survey import BINARY_COLS, RAW_CSV, TARGET, clean_columns
+
+# ── Synthetic survey generator for scale benchmarks ──────────────────────────
+# python synth_data.py --rows 10000000 --out synth_10M.parquet --seed 0
+#
+# Fits one Gaussian copula per class on the real survey:
+#   · class balance                     P(LUNG_CANCER = YES)
+#   · marginals                         gender / symptom rates, empirical age quantiles
+#   · dependence                        tetrachoric (binary × binary) and biserial
+#                                       (age × binary) latent correlations
+# then streams rows in the raw schema (M/F, 1/2, YES/NO, original headers).
+# Chunk i is drawn from rng([seed, i]), so output is fully determined by
+# (seed, chunksize) and memory stays at one chunk regardless of --rows.
+
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+
+def _tetrachoric(p11, t_i, t_j, iters=40):
+    # latent ρ with P(Z_i > t_i, Z_j > t_j) = p11, by bisection (monotone in ρ)
+    lo, hi = -0.95, 0.95
+    for _ in range(iters):
+        mid = (lo + hi) / 2
+        p = multivariate_normal(mean=[0, 0], cov=[[1, mid], [mid, 1]]).cdf([-t_i, -t_j])
+        lo, hi = (mid, hi) if p < p11 else (lo, mid)
+    return (lo + hi) / 2
+
+def _nearest_correlation(R, floor=1e-4):
+    w, V = np.linalg.eigh((R + R.T) / 2)
+    R = (V * np.maximum(w, floor)) @ V.T
+    d = np.sqrt(np.diag(R))
+    return R / np.outer(d, d)
+
+def fit(df):
+    # → generator parameters; column order inside each class: AGE, GENDER, *BINARY_COLS
+    df = clean_columns(df.copy())
+    is_yes = (df[TARGET] == 'YES').to_numpy()
+    params = {"p_yes": float(is_yes.mean()), "classes": {}}
+    for label, mask in (("YES", is_yes), ("NO", ~is_yes)):
+        sub = df[mask]
+        n = len(sub)
+        B = np.column_stack([(sub['GENDER'] == 'M').to_numpy(),
+                             (sub[BINARY_COLS] == 2).to_numpy()]).astype(np.float64)
+        rates = np.clip(B.mean(axis=0), 0.5 / n, 1 - 0.5 / n)
+        thr = ndtri(1 - rates)
+        age = sub['AGE'].to_numpy(dtype=np.float64)
+        age_scores = ndtri((pd.Series(age).rank().to_numpy() - 0.5) / n)
+
+        k = B.shape[1]
+        R = np.eye(k + 1)
+        for j in range(k):
+            r_pb = np.corrcoef(age_scores, B[:, j])[0, 1] if B[:, j].std() > 0 else 0.0
+            pdf = np.exp(-thr[j] ** 2 / 2) / np.sqrt(2 * np.pi)
+            R[0, j + 1] = R[j + 1, 0] = np.clip(r_pb * np.sqrt(rates[j] * (1 - rates[j])) / pdf, -0.95, 0.95)
+            for i in range(j):
+                p11 = np.clip((B[:, i] * B[:, j]).mean(), 0.25 / n, None)
+                R[i + 1, j + 1] = R[j + 1, i + 1] = _tetrachoric(p11, thr[i], thr[j])
+        R = _nearest_correlation(R)
+        params["classes"][label] = {"thresholds": thr, "age_quantiles": np.sort(age),
+                                    "chol": np.linalg.cholesky(R)}
+    return params
+
+def sample(params, n, rng, columns):
+    n_yes = rng.binomial(n, params["p_yes"])
+    parts = []
+    for label, m in (("YES", n_yes), ("NO", n - n_yes)):
+        c = params["classes"][label]
+        z = rng.standard_normal((m, c["chol"].shape[0])) @ c["chol"].T
+        q = c["age_quantiles"]
+        age = np.interp(ndtr(z[:, 0]) * (len(q) - 1), np.arange(len(q)), q)
+        binary = z[:, 1:] > c["thresholds"]
+        part = pd.DataFrame({"GENDER": np.where(binary[:, 0], "M", "F"),
+                             "AGE": np.rint(age).astype(np.int64)})
+        for j, col in enumerate(BINARY_COLS):
+            part[col] = binary[:, j + 1].astype(np.int64) + 1
+        part[TARGET] = label
+        parts.append(part)
+    out = pd.concat(parts, ignore_index=True)
+    out = out.iloc[rng.permutation(n)].reset_index(drop=True)     # interleave classes
+    out.columns = [columns.get(c, c) for c in out.columns]
+    return out
+
+def raw_header(path=RAW_CSV):
+    # stripped name → original header (keeps "FATIGUE ", "ALLERGY " as in the source file)
+    original = pd.read_csv(path, nrows=0).columns
+    return {c.strip(): c for c in original}, list(original)
+
+def generate(n_rows, seed=0, chunksize=1_000_000, source=RAW_CSV):
+    # yields raw-schema DataFrames of at most `chunksize` rows
+    params = fit(pd.read_csv(source))
+    names, order = raw_header(source)
+    for i, start in enumerate(range(0, n_rows, chunksize)):
+        rng = np.random.default_rng([seed, i])
+        yield sample(params, min(chunksize, n_rows - start), rng, names)[order]
+
+class _Writer:
+    def __init__(self, path, fmt):
+        self.path, self.fmt, self.w = path, fmt, None
+
+    def write(self, df):
+        if self.fmt == "csv":
+            df.to_csv(self.path, mode="a" if self.w else "w", header=self.w is None, index=False)
+            self.w = True
+            return
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.w is None:
+            if self.fmt == "parquet":
+                import pyarrow.parquet as pq
+                self.w = pq.ParquetWriter(self.path, table.schema)
+            else:
+                self.w = pa.ipc.new_file(self.path, table.schema)
+        self.w.write_table(table)
+
+    def close(self):
+        if self.fmt != "csv" and self.w is not None:
+            self.w.close()
+
+def compare(real, synth):
+    # summary of how closely the synthetic joint structure follows the real survey
+    def stats(df):
+        df = clean_columns(df.copy())
+        y = df[TARGET] == 'YES'
+        S = (df[BINARY_COLS] == 2).to_numpy().astype(float)
+        return {"p_yes": y.mean(),
+                "age_yes": df.loc[y, 'AGE'].mean(), "age_no": df.loc[~y, 'AGE'].mean(),
+                "rates": S.mean(0), "cooc": S.T @ S / len(S)}
+    r, s = stats(real), stats(synth)
+    print(f"P(YES)            real {r['p_yes']:.3f} · synth {s['p_yes']:.3f}")
+    print(f"mean age YES / NO real {r['age_yes']:.1f} / {r['age_no']:.1f} · synth {s['age_yes']:.1f} / {s['age_no']:.1f}")
+    print(f"symptom rates     max |Δ| {np.abs(r['rates'] - s['rates']).max():.3f}")
+    print(f"co-occurrence     max |Δ| {np.abs(r['cooc'] - s['cooc']).max():.3f}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Generate synthetic lung-cancer survey rows")
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--out", help="output file: .csv, .parquet, .arrow/.feather")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--chunksize", type=int, default=1_000_000)
+    ap.add_argument("--check", action="store_true", help="compare a sample against the real survey")
+    args = ap.parse_args()
+
+    if args.check:
+        synth = next(generate(min(args.rows, 1_000_000), args.seed, args.chunksize))
+        compare(pd.read_csv(RAW_CSV), synth)
+    if args.out:
+        fmt = FORMATS.get(os.path.splitext(args.out)[1].lower())
+        if fmt is None:
+            raise SystemExit(f"❌ Unknown output format for {args.out}; use one of {sorted(FORMATS)}")
+        writer = _Writer(args.out, fmt)
+        t0 = time.perf_counter()
+        done = 0
+        try:
+            for chunk in generate(args.rows, args.seed, args.chunksize):
+                writer.write(chunk)
+                done += len(chunk)
+                print(f"\r{done:,} / {args.rows:,} rows", end="", file=sys.stderr, flush=True)
+        finally:
+            writer.close()
+        elapsed = time.perf_counter() - t0
+        print(file=sys.stderr)
+        print(f"✅ Wrote {done:,} rows to {args.out} in {elapsed:.1f}s ({done/elapsed:,.0f} rows/s)")
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import roc_auc_score
+from backends import make_model
+from flat_ensemble import FlatEnsemble
+from similarity import SymptomIndex, symptom_mask
+from survey import BINARY_COLS, FEATURE_NAMES, encode_record
+from train_model import bootstrap_metrics
+
+# ── Core invariants: flat engine ≡ sklearn, input validation, metrics, index ─
+# python -m pytest -q
+
+def survey_like(n, seed=0):
+    # encoded feature frame in the model's layout: GENDER 0/1, AGE, symptoms 0/1
+    rng = np.random.default_rng(seed)
+    X = rng.integers(0, 2, (n, len(FEATURE_NAMES))).astype(np.float64)
+    X[:, 1] = rng.integers(21, 88, n)
+    y = (X[:, 2:6].sum(axis=1) + (X[:, 1] > 60) + rng.random(n) * 2 > 3).astype(int)
+    return pd.DataFrame(X, columns=FEATURE_NAMES), y
+
+@pytest.mark.parametrize("backend", ["gbc", "hist"])
+def test_flat_ensemble_matches_sklearn(backend):
+    X, y = survey_like(600)
+    model = make_model(backend, dict(n_estimators=40, learning_rate=0.1, max_depth=3,
+                                     subsample=0.8, min_samples_split=10, random_state=0)).fit(X, y)
+    X_new, _ = survey_like(2_000, seed=1)
+    X_new["AGE"] = np.random.default_rng(2).uniform(15, 95, len(X_new))   # off-grid ages too
+    labels, proba = FlatEnsemble.from_model(model).predict(X_new.to_numpy(np.float32))
+    np.testing.assert_allclose(proba, model.predict_proba(X_new)[:, 1], rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(labels, model.predict(X_new))
+
+def raw_record(**overrides):
+    rec = {"GENDER": "M", "AGE": 63, **{c: 1 for c in BINARY_COLS}}
+    rec.update(overrides)
+    return rec
+
+def test_encode_record_accepts_raw_schema():
+    row = encode_record(raw_record(GENDER=" f ", **{BINARY_COLS[0]: 2}))
+    assert row == [0.0, 63.0, 1.0] + [0.0] * (len(BINARY_COLS) - 1)
+
+@pytest.mark.parametrize("bad", [
+    {"GENDER": "X"},
+    {"AGE": "old"},
+    {"AGE": None},
+    {"AGE": True},
+    {"AGE": float("nan")},
+    {"AGE": "inf"},
+    {BINARY_COLS[0]: 0},
+    {BINARY_COLS[0]: 3},
+    {BINARY_COLS[0]: "2"},
+    {BINARY_COLS[0]: True},
+])
+def test_encode_record_rejects_bad_input(bad):
+    with pytest.raises(ValueError):
+        encode_record(raw_record(**bad))
+
+def test_encode_record_rejects_missing_field():
+    rec = raw_record()
+    del rec["AGE"]
+    with pytest.raises(ValueError, match="AGE"):
+        encode_record(rec)
+
+def test_bootstrap_point_auc_matches_sklearn():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 500)
+    proba = np.round(np.clip(y * 0.3 + rng.random(500) * 0.7, 0, 1), 2)   # rounded: plenty of ties
+    out = bootstrap_metrics(y, proba, proba > 0.5, n_boot=200)
+    assert out["metrics"]["auc"]["point"] == pytest.approx(roc_auc_score(y, proba), abs=1e-12)
+
+def test_symptom_index_counts_match_iterrows():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.integers(1, 3, (300, len(BINARY_COLS))), columns=BINARY_COLS)
+    df["AGE"] = rng.integers(21, 88, len(df))
+    index = SymptomIndex.from_frame(df)
+    for active in (BINARY_COLS[:1], BINARY_COLS[2:7], BINARY_COLS, []):
+        # the loop the index replaced
+        expected = [sum(1 for s in active if row.get(s, 1) == 2) for _, row in df.iterrows()]
+        mask = symptom_mask(active)
+        rows = index.top_k(mask, k=8)
+        np.testing.assert_array_equal(index.matches(mask, np.arange(len(df))), expected)
+        assert sorted(index.matches(mask, rows).tolist(), reverse=True) == sorted(expected, reverse=True)[:8]
@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import pickle
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+from bundle import BUNDLE_FILE, read_header
+from survey import FEATURE_NAMES, RAW_CSV, TARGET, clean_columns, encode_features
+from train_model import BASE_PARAMS, evaluate, load_training_data, save_artifacts, split
+from backends import make_model
+
+# ── Out-of-core and incremental training ─────────────────────────────────────
+# python train_incremental.py stream registry.csv --chunksize 200000 --trees-per-chunk 20
+#     Streams the file; each chunk adds `trees-per-chunk` trees fitted on that
+#     chunk to the ensemble so far (GradientBoosting warm_start). Only one chunk
+#     is ever in memory.
+# python train_incremental.py extend new_responses.csv --trees 20
+#     Loads the current model and appends trees fitted on the new records only,
+#     instead of refitting all trees from zero.
+#
+# --compare runs a from-scratch, all-in-memory retrain with the same total tree
+# count in a child process and reports time saved and peak-memory difference.
+# --save writes the updated model into the usual pickles + bundle.
+
+def max_rss_mb(who=resource.RUSAGE_SELF):
+    return resource.getrusage(who).ru_maxrss / 1024
+
+def read_labelled(df):
+    X, valid = encode_features(clean_columns(df))
+    y = (df[TARGET].astype(str).str.strip().str.upper() == 'YES').to_numpy()
+    return pd.DataFrame(X[valid], columns=FEATURE_NAMES), y[valid].astype(int)
+
+def holdout():
+    # the real survey's test split — fixed yardstick for every mode
+    X, y, *_ = load_training_data()
+    _, X_test, _, y_test = split(X, y)
+    return X_test, y_test
+
+def survey_train_split():
+    # what the shipped model was fitted on; the survey's test rows never enter a baseline
+    X, y, *_ = load_training_data()
+    X_train, _, y_train, _ = split(X, y)
+    return X_train[FEATURE_NAMES], y_train.to_numpy()
+
+def stream_fit(path, chunksize, trees_per_chunk):
+    model, rows = None, 0
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        Xc, yc = read_labelled(chunk)
+        if model is None:
+            model = make_model("gbc", dict(BASE_PARAMS, n_estimators=trees_per_chunk))
+            model.set_params(warm_start=True)
+        else:
+            model.set_params(n_estimators=model.n_estimators + trees_per_chunk)
+        model.fit(Xc, yc)
+        rows += len(Xc)
+        print(f"\r{rows:,} rows · {model.n_estimators} trees · peak RSS {max_rss_mb():.0f} MB",
+              end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    return model, rows
+
+def extend_fit(model, path, trees):
+    Xn, yn = read_labelled(pd.read_csv(path))
+    model.set_params(warm_start=True, n_estimators=model.n_estimators + trees)
+    model.fit(Xn, yn)
+    return model, len(Xn)
+
+def full_fit(paths, trees):
+    X, y = zip(*(survey_train_split() if p == RAW_CSV else read_labelled(pd.read_csv(p)) for p in paths))
+    model = make_model("gbc", dict(BASE_PARAMS, n_estimators=trees))
+    model.fit(pd.concat(X, ignore_index=True), np.concatenate(y))
+    return model
+
+def run_full_in_child(paths, trees):
+    out = subprocess.run([sys.executable, "-W", "ignore", os.path.abspath(__file__), "full", *paths,
+                          "--trees", str(trees)], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def save(model, info):
+    # keep the current artifacts, refresh test metrics and record the incremental run
+    artifacts = read_header(BUNDLE_FILE)["artifacts"] if os.path.exists(BUNDLE_FILE) else {}
+    X_test, y_test = holdout()
+    artifacts.update(evaluate(model, X_test, y_test))
+    artifacts["params"] = dict(artifacts.get("params", BASE_PARAMS), n_estimators=int(model.n_estimators))
+    artifacts.setdefault("feature_names", FEATURE_NAMES)
+    artifacts["incremental"] = artifacts.get("incremental", []) + [info]
+    with open("lung_le_gender.pkl", "rb") as f: le_g = pickle.load(f)
+    with open("lung_le_target.pkl", "rb") as f: le_t = pickle.load(f)
+    save_artifacts(model, le_g, le_t, artifacts)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Chunked / incremental training of the gradient boosting model")
+    ap.add_argument("mode", choices=["stream", "extend", "full"])
+    ap.add_argument("paths", nargs="+", help="raw-schema CSV file(s)")
+    ap.add_argument("--chunksize", type=int, default=200_000)
+    ap.add_argument("--trees-per-chunk", type=int, default=20)
+    ap.add_argument("--trees", type=int, default=20, help="extend: trees to add · full: total trees")
+    ap.add_argument("--model", default="lung_xgb_model.pkl", help="extend: model to grow")
+    ap.add_argument("--compare", action="store_true", help="also time a full in-memory retrain")
+    ap.add_argument("--save", action="store_true", help="write the result as the current model")
+    args = ap.parse_args()
+
+    if args.mode == "full":
+        t0 = time.perf_counter()
+        model = full_fit(args.paths, args.trees)
+        X_test, y_test = holdout()
+        print(json.dumps({"seconds": time.perf_counter() - t0, "peak_rss_mb": max_rss_mb(),
+                          "auc": roc_auc_score(y_test, model.predict_proba(X_test)[:, 1])}))
+        sys.exit()
+
+    t0 = time.perf_counter()
+    if args.mode == "stream":
+        model, rows = stream_fit(args.paths[0], args.chunksize, args.trees_per_chunk)
+        baseline_paths = args.paths[:1]
+    else:
+        with open(args.model, "rb") as f: model = pickle.load(f)
+        model, rows = extend_fit(model, args.paths[0], args.trees)
+        baseline_paths = [RAW_CSV, args.paths[0]]
+    elapsed = time.perf_counter() - t0
+
+    X_test, y_test = holdout()
+    auc = roc_auc_score(y_test, model.predict_proba(X_test)[:, 1])
+    info = {"mode": args.mode, "source": os.path.basename(args.paths[0]), "rows": rows,
+            "trees": int(model.n_estimators), "seconds": round(elapsed, 3),
+            "peak_rss_mb": round(max_rss_mb(), 1), "auc": round(auc, 4)}
+    print(f"✅ {args.mode}: {rows:,} rows → {model.n_estimators} trees in {elapsed:.2f}s · "
+          f"peak RSS {info['peak_rss_mb']:.0f} MB · holdout AUC {auc:.4f}")
+
+    if args.compare:
+        full = run_full_in_child(baseline_paths, int(model.n_estimators))
+        info["full_retrain"] = {k: round(v, 4) for k, v in full.items()}
+        print(f"   full retrain: {full['seconds']:.2f}s · peak RSS {full['peak_rss_mb']:.0f} MB · "
+              f"holdout AUC {full['auc']:.4f} → saved {full['seconds'] - elapsed:.2f}s "
+              f"({1 - elapsed / full['seconds']:.0%})")
+    if args.save:
+        save(model, info)
+        print("✅ Model, pickles and bundle updated!")
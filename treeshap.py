@@ -0,0 +1,184 @@
+import argparse
+import time
+from math import factorial
+import numpy as np
+
+# ── Batched path-dependent TreeSHAP over a FlatEnsemble ──────────────────────
+# Exact per-row additive feature contributions (log-odds), same definition as
+# TreeSHAP's "tree_path_dependent" mode: absent features follow both children
+# weighted by training cover.
+#
+# For one leaf with unique path features P, the leaf's share of E[f | x_S] is
+#   value · Π_{j∈P} (o_j if j ∈ S else z_j)
+# where z_j is the cover fraction of the path's branches on j and o_j ∈ {0,1}
+# says whether x itself takes them. Its Shapley values therefore depend only
+# on the leaf and the bit pattern o — at most 2^depth patterns per leaf. Those
+# are tabulated once when the explainer is built; explaining a batch is then
+# one condition-bit pass (as in scoring), one pattern gather per leaf and a
+# scatter-add into feature columns. Sum of contributions + expected_value =
+# engine.raw(x) exactly.
+
+SHAP_CHUNK = 256
+MAX_PATH_FEATURES = 10
+
+class TreeShap:
+    def __init__(self, engine):
+        if engine.cover is None:
+            raise ValueError("ensemble has no node cover; rebuild it from the fitted model")
+        self.engine = engine
+        self.n_features = int(engine.feature.max()) + 1
+        if engine.feature_names is not None:
+            self.n_features = max(self.n_features, len(engine.feature_names))
+
+        leaves, steps = [], []          # steps: per leaf [(node, went_right), ...] root → leaf
+        for root in engine.roots:
+            stack = [(int(root), [])]
+            while stack:
+                node, path = stack.pop()
+                l, r = engine.left[node], engine.right[node]
+                if l == node:
+                    leaves.append(node); steps.append(path)
+                    continue
+                stack.append((int(l), path + [(node, 0)]))
+                stack.append((int(r), path + [(node, 1)]))
+
+        L, D = len(leaves), max(1, engine.depth)
+        if D > MAX_PATH_FEATURES:
+            raise ValueError(f"trees deeper than {MAX_PATH_FEATURES} are not supported")
+        cover, child = engine.cover, engine._child
+        self._step_cond = np.zeros((L, D), dtype=np.intp)
+        self._step_dir  = np.zeros((L, D), dtype=bool)
+        self._step_slot = np.full((L, D), D, dtype=np.uint16)     # slot D = padding, masked out
+        slot_feature = np.zeros((L, D), dtype=np.intp)
+        z = np.ones((L, D))
+        m = np.zeros(L, dtype=np.intp)
+        for i, path in enumerate(steps):
+            slots = {}
+            for s, (node, went_right) in enumerate(path):
+                f = engine.feature[node]
+                j = slots.setdefault(f, len(slots))
+                slot_feature[i, j] = f
+                z[i, j] *= cover[child[2 * node + went_right]] / cover[node]
+                self._step_cond[i, s] = engine._node_cond[node]
+                self._step_dir[i, s]  = went_right
+                self._step_slot[i, s] = j
+            m[i] = len(slots)
+        value = engine.value[leaves]
+        self._full = ((1 << m) - 1).astype(np.uint16)
+        self._phi = _pattern_table(value, z, m, D)               # (L, 2^D, D)
+        # one (L·2^D) row per (leaf, pattern), gathered as opaque D×8-byte records
+        self._phi_rows = self._phi.view(np.dtype((np.void, 8 * D))).reshape(-1)
+        self._leaf_base = np.arange(L, dtype=np.intp) * self._phi.shape[1]
+        self._step_bit = (1 << self._step_slot).astype(np.uint16)
+        # (L·D, F) one-hot: slot → feature column; padded slots carry zero contributions
+        self._scatter = np.zeros((L * D, self.n_features))
+        self._scatter[np.arange(L * D), slot_feature.ravel()] = 1.0
+        self.expected_value = engine.init + float((value * z.prod(axis=1)).sum())
+
+    def _chunk(self, X):
+        e = self.engine
+        go = (X[:, e._cond_feature] > e._cond_threshold).T             # (conditions, n)
+        fail = np.zeros((len(self._full), len(X)), dtype=np.uint16)
+        for cond, right, bit in zip(self._step_cond.T, self._step_dir.T, self._step_bit.T):
+            fail |= (go[cond] != right[:, None]) * bit[:, None]
+        pattern = self._full[:, None] & ~fail                           # (L, n)
+        vals = np.take(self._phi_rows, self._leaf_base[:, None] + pattern)
+        vals = vals.view(np.float64).reshape(len(self._full), len(X), -1).transpose(0, 2, 1)
+        return (self._scatter.T @ vals.reshape(-1, len(X))).T
+
+    def shap_values(self, X):
+        # → (n, n_features) contributions; identical rows are explained once
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        uniq, inverse = np.unique(X, axis=0, return_inverse=True)
+        out = np.empty((len(uniq), self.n_features))
+        for s in range(0, len(uniq), SHAP_CHUNK):
+            out[s:s + SHAP_CHUNK] = self._chunk(uniq[s:s + SHAP_CHUNK])
+        return out[inverse.ravel()]
+
+def _pattern_table(value, z, m, D):
+    # phi[l, o, i] = value_l · (o_i − z_i) · Σ_k c_k · k!(m−1−k)!/m!
+    # with c_k the t^k coefficient of Π_{j≠i} (z_j + o_j t)
+    L = len(value)
+    phi = np.zeros((L, 1 << D, D))
+    for size in np.unique(m):
+        rows = np.flatnonzero(m == size)
+        if size == 0:
+            continue
+        zs, v = z[rows, :size], value[rows]
+        weight = np.array([factorial(k) * factorial(size - 1 - k) / factorial(size) for k in range(size)])
+        for pattern in range(1 << size):
+            o = np.array([(pattern >> j) & 1 for j in range(size)], dtype=np.float64)
+            for i in range(size):
+                c = np.zeros((len(rows), size))
+                c[:, 0] = 1.0
+                for j in range(size):
+                    if j == i:
+                        continue
+                    c[:, 1:] = c[:, 1:] * zs[:, [j]] + c[:, :-1] * o[j]
+                    c[:, 0] *= zs[:, j]
+                phi[rows, pattern, i] = v * (o[i] - zs[:, i]) * (c @ weight)
+    return phi
+
+def brute_force(engine, x):
+    # exact Shapley values of the path-dependent game over all 2^F coalitions — for checking only
+    F = len(x)
+    masks = np.arange(1 << F)
+    in_s = (masks[:, None] >> np.arange(F)) & 1
+    cover = engine.cover
+
+    def expect(node):
+        l, r = engine.left[node], engine.right[node]
+        if l == node:
+            return np.full(len(masks), engine.value[node])
+        f = engine.feature[node]
+        follow = r if x[f] > engine.threshold[node] else l
+        both = (cover[l] * expect(l) + cover[r] * expect(r)) / cover[node]
+        return np.where(in_s[:, f] == 1, expect(follow), both)
+
+    v = sum(expect(int(root)) for root in engine.roots)
+    size = in_s.sum(axis=1)
+    w = np.array([factorial(k) * factorial(F - 1 - k) / factorial(F) for k in range(F)])
+    phi = np.empty(F)
+    for i in range(F):
+        without = in_s[:, i] == 0
+        phi[i] = (w[size[without]] * (v[masks[without] | (1 << i)] - v[without])).sum()
+    return phi
+
+
+if __name__ == "__main__":
+    import pandas as pd
+    from bundle import BUNDLE_FILE, load_engine
+    from survey import RAW_CSV, clean_columns, encode_features
+
+    ap = argparse.ArgumentParser(description="Check and time batched TreeSHAP on the model")
+    ap.add_argument("--model", default=BUNDLE_FILE)
+    ap.add_argument("--rows", type=int, default=100_000, help="batch size for the timing run")
+    ap.add_argument("--check", type=int, default=3, help="rows to compare against brute-force Shapley")
+    args = ap.parse_args()
+
+    engine = load_engine(args.model)
+    t0 = time.perf_counter()
+    explainer = TreeShap(engine)
+    print(f"explainer built in {(time.perf_counter() - t0)*1e3:.0f} ms · expected value {explainer.expected_value:+.4f}")
+
+    X, valid = encode_features(clean_columns(pd.read_csv(RAW_CSV)))
+    X = X[valid]
+    phi = explainer.shap_values(X)
+    err = np.abs(phi.sum(axis=1) + explainer.expected_value - engine.raw(X)).max()
+    print(f"additivity on {len(X)} survey rows: max |Σφ + E − raw| = {err:.2e}")
+    for x, row in zip(X[:args.check], phi[:args.check]):
+        print(f"brute force max |Δφ| = {np.abs(brute_force(engine, x) - row).max():.2e}")
+
+    t0 = time.perf_counter()
+    explainer.shap_values(X[0])
+    print(f"one patient: {(time.perf_counter() - t0)*1e3:.2f} ms")
+    rng = np.random.default_rng(0)
+    big = X[rng.integers(0, len(X), args.rows)].copy()
+    big[:, 1] = rng.integers(21, 88, args.rows)
+    big[:, 2:] = rng.integers(0, 2, (args.rows, X.shape[1] - 2))
+    t0 = time.perf_counter()
+    explainer.shap_values(big)
+    elapsed = time.perf_counter() - t0
+    print(f"{args.rows:,} rows: {elapsed:.2f}s ({args.rows/elapsed:,.0f} rows/s)")